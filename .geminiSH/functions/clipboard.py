@@ -4,8 +4,10 @@ for the GeminiSH application.
 """
 
 import os
-import pyperclip
 from output_manager import OutputManager
+from lazy_module import LazyModule
+
+pyperclip = LazyModule("pyperclip")
 
 output_manager = OutputManager()
 DEBUG = os.getenv("DEBUG")
@@ -4,6 +4,7 @@ for the GeminiSH application.
 """
 
 import os
+import codecs
 import mimetypes
 import urllib.request
 from rich.progress import (
@@ -15,8 +16,11 @@ from rich.progress import (
     TransferSpeedColumn,
 )
 from output_manager import OutputManager
+from cache_manager import CacheManager
+from html_extractor import HtmlExtractor
 
 output_manager = OutputManager()
+cache_manager = CacheManager()
 
 DEBUG = os.getenv("DEBUG")
 
@@ -33,28 +37,60 @@ progress = Progress(
 )
 
 
-def download(url: str):
+def download(url: str, output_format: str = "markdown"):
     """
     Download the content or the file of the given url.
+    Web pages are converted to readable text, without scripts, styles or navigation menus.
     IMPORTANT: Only use this function if the user give you a url.
 
     Parameters:
     url (str): The url of the web or file to download.
+    output_format (str) 'markdown' | 'text': How to return the content of web pages.
+    Default is markdown, which keeps headings, lists and links.
 
     Returns:
     str | file: Contains the text content if readable, or the file.
     """
-    supported_mime_types = output_manager.config_manager.config["MODEL_SUPPORTED_MIME_TYPES"]
+    config = output_manager.config_manager.config
+    supported_mime_types = config["MODEL_SUPPORTED_MIME_TYPES"]
+    max_chars = config["DOWNLOAD_MAX_CHARS"]
     try:
         filename = url.split("/")[-1]
         response = urllib.request.urlopen(url)
         mime_type, _ = mimetypes.guess_type(url)
+        if response.headers.get("Content-Type"):
+            header_mime_type = response.headers.get_content_type()
+            if not mime_type or "html" in header_mime_type:
+                mime_type = header_mime_type
+
+        if mime_type and "html" in mime_type:
+            # Extract the readable content while downloading, stopping at the size cap
+            charset = response.headers.get_content_charset() or "utf-8"
+            try:
+                decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+            except LookupError:
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            extractor = HtmlExtractor(output_format=output_format, max_chars=max_chars)
+
+            with output_manager.managed_status("[bold yellow]Reading web page...[/bold yellow]"):
+                for data in iter(lambda: response.read(32768), b""):
+                    extractor.feed(decoder.decode(data))
+                    if extractor.is_full:
+                        break
+                extractor.feed(decoder.decode(b"", final=True))
+                extractor.close()
+            response.close()
+
+            title = f" ({extractor.title})" if extractor.title else ""
+            content = extractor.get_text()
+            content = (
+                f"---Start content of web: {url}{title}---\n{content}\n---End of content of web---"
+            )
+            return content
 
         # Check MIME type and process accordingly
         if mime_type and mime_type in supported_mime_types:
-            dest_path = os.path.join(
-                os.path.dirname(os.path.abspath(__file__)), "..", "cache", filename
-            )
+            dest_path = cache_manager.get_file_path(filename)
             task_id = progress.add_task("download", filename=filename, start=False)
 
             with output_manager.managed_status("[bold yellow]Downloading file...[/bold yellow]"):
@@ -67,6 +103,7 @@ def download(url: str):
                         for data in iter(lambda: response.read(32768), b""):
                             dest_file.write(data)
                             progress.update(task_id, advance=len(data))
+            cache_manager.add(dest_path)
 
             return {
                 "response": "The file is ready, uset it.",
@@ -77,7 +114,8 @@ def download(url: str):
             }
 
         elif mime_type and "text" in mime_type:
-            content = response.read().decode("utf-8")
+            content = response.read(max_chars * 4 if max_chars else -1)
+            content = content.decode("utf-8", errors="ignore")[: max_chars or None]
             content = f"---Start content of web: {url}---\n{content}\n---End of content of web---"
             return content
 
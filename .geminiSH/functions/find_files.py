@@ -0,0 +1,43 @@
+"""
+This module provides functionality to find files by name in the working directory
+for the GeminiSH application.
+"""
+
+import os
+from output_manager import OutputManager
+from path_index import PathIndex
+
+output_manager = OutputManager()
+path_index = PathIndex()
+
+DEBUG = os.getenv("DEBUG")
+
+
+def find_files(pattern: str, limit: int = 50):
+    """
+    Find files in the working directory by name or path, using a persistent index.
+    Use it instead of running find or ls with bash to locate files.
+
+    Parameters:
+    pattern (str): A glob pattern like '*.py' or 'src/**/test_*.py' ('**/' is any number of
+                   folders, none included), or part of a name or path like 'chat_manager'
+                   (also matched fuzzily, e.g. 'chtmgr').
+    limit (int): The maximum number of paths returned. Default is 50.
+
+    Returns:
+    str: The matching paths, relative to the working directory, best matches first.
+    """
+    if not pattern or not pattern.strip():
+        return "[error]Empty pattern provided[/error]"
+    try:
+        paths, total = path_index.find(pattern, int(limit))
+    except Exception as e:
+        if DEBUG:
+            output_manager.print(e)
+        return f"[error]An error occurred while finding files: {e}[/error]"
+    if not paths:
+        return f"No files match {pattern!r} in {path_index.root}."
+    result = f"Files matching {pattern!r} in {path_index.root}:\n" + "\n".join(paths)
+    if total > len(paths):
+        result += f"\n[{total - len(paths)} more matches, use a more specific pattern]"
+    return result
@@ -1,27 +1,86 @@
 """
-This module provides functionality to retrieve the content of a single file 
+This module provides functionality to retrieve the content of a single file
 for the GeminiSH application.
 """
 
 import os
+import re
 import mimetypes
 from output_manager import OutputManager
+from line_index import LineIndex
+from document_extractor import DocumentExtractor
 
 output_manager = OutputManager()
+document_extractor = DocumentExtractor()
 
 DEBUG = os.getenv("DEBUG")
 
-def get_content_file(file_path):
+def get_content_file(
+    file_path,
+    start_line: int = 0,
+    end_line: int = 0,
+    head: int = 0,
+    tail: int = 0,
+    grep: str = "",
+):
     """
     Processes a single file and gets the content.
     If the user wants to work with a single file, execute this function first.
+    If the file was already loaded in the chat, only its changes since then are returned.
+    For large files (e.g. logs) read only a part of it with the optional parameters.
 
     Parameters:
     file_path (str): The absolute path of the file to process.
+    start_line (int): The first line to read, starting at 1.
+    end_line (int): The last line to read (included).
+    head (int): Read only the first lines, this number of them.
+    tail (int): Read only the last lines, this number of them.
+    grep (str): A regular expression; return only the matching lines, with their numbers.
+                It searches between start_line and end_line if they are set.
 
     Returns:
     str | file: Contains the text content if readable, or the file.
     """
+    max_bytes = output_manager.config_manager.config["FILE_READ_MAX_BYTES"]
+
+    def read_partial():
+        """Read a window of the file through its line index, without loading the whole file."""
+        index = LineIndex.get(file_path)
+        file_name = os.path.basename(file_path)
+        line_count = index.line_count
+        # The model sends numbers as floats; lines are 1-based for the model, 0-based here
+        start = max(int(start_line or 1), 1) - 1
+        end = min(int(end_line or line_count), line_count)
+        if head:
+            end = min(end, start + int(head))
+        if tail:
+            start = max(start, end - int(tail))
+
+        if grep:
+            try:
+                matches = index.grep(grep, start, end)
+            except re.error as e:
+                return f"[error]Invalid regular expression {grep!r}: {e}[/error]"
+            header = f"---Lines of file {file_name} ({line_count} lines) matching {grep!r}---\n"
+            body = "".join(f"{line + 1}: {text}\n" for line, text in matches)
+            if len(matches) == 100:
+                body += "[Only the first 100 matches are shown, narrow the search]\n"
+            return f"{header}{body or 'No lines match.'}---End of matches---"
+
+        text = index.read_lines(start, end)
+        note = ""
+        if len(text.encode("utf-8")) > max_bytes:
+            text = text.encode("utf-8")[:max_bytes].decode("utf-8", errors="ignore")
+            text = text[: text.rfind("\n") + 1]
+            end = start + text.count("\n")
+            note = "[Too large to read at once, read the next lines with another call or grep]\n"
+        if text and not text.endswith("\n"):
+            text += "\n"
+        return (
+            f"---Lines {start + 1}-{end} of file {file_name} ({line_count} lines)---\n"
+            f"{text}{note}---End of lines---"
+        )
+
     num_bytes = 1024
     supported_mime_types = output_manager.config_manager.config["MODEL_SUPPORTED_MIME_TYPES"]
     try:
@@ -29,9 +88,16 @@ def get_content_file(file_path):
             try:
                 with open(file_path, "r", encoding="utf-8") as f:
                     f.read(num_bytes)
-                with open(file_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-                    
+                    is_partial = start_line or end_line or head or tail or grep
+                    if not is_partial and os.fstat(f.fileno()).st_size <= max_bytes:
+                        f.seek(0)
+                        lines = f.readlines()
+                if is_partial or os.path.getsize(file_path) > max_bytes:
+                    return {
+                        "response": read_partial(),
+                        "response_to_agent": {"require_execution_result": True},
+                    }
+
                 file_name = os.path.basename(file_path)
                 content = [f"---Start of file {file_name}---"]
                 content.extend(lines)
@@ -39,9 +105,31 @@ def get_content_file(file_path):
                 content_str = "".join(content)
                 return {
                     "response": content_str,
-                    "response_to_agent": {"require_execution_result": True},
+                    "response_to_agent": {
+                        "require_execution_result": True,
+                        # Lets the agent send only the changes if the file was loaded before
+                        "file_content": {
+                            "file_path": os.path.abspath(file_path),
+                            "content": "".join(lines),
+                        },
+                    },
                 }
             except (UnicodeDecodeError, IOError):
+                # Documents are read locally, only media files are uploaded
+                text = (
+                    document_extractor.extract(file_path)
+                    if document_extractor.can_extract(file_path)
+                    else None
+                )
+                if text is not None:
+                    file_name = os.path.basename(file_path)
+                    return {
+                        "response": (
+                            f"---Start of text of document {file_name}---\n{text}\n"
+                            f"---End of text of document {file_name}---"
+                        ),
+                        "response_to_agent": {"require_execution_result": True},
+                    }
                 mime_type, _ = mimetypes.guess_type(file_path)
                 if mime_type in supported_mime_types:
                     return {
@@ -58,4 +146,5 @@ def get_content_file(file_path):
     except Exception as e:
         if DEBUG:
             output_manager.print(e)
-        return "[error]An error occurred while processing the file[/error]"
\ No newline at end of file
+        return "[error]An error occurred while processing the file[/error]"
+
@@ -6,10 +6,15 @@ for the GeminiSH application.
 import os
 import mimetypes
 from output_manager import OutputManager
+from document_extractor import DocumentExtractor
 
 output_manager = OutputManager()
+document_extractor = DocumentExtractor()
 
 DEBUG = os.getenv("DEBUG")
+# Walking and reading large trees runs in a worker process, see function_worker_pool.py
+ISOLATED = True
+TIMEOUT = 120
 
 
 def get_content_of_folder(directory_path, recursive=True):
@@ -54,6 +59,12 @@ def get_content_of_folder(directory_path, recursive=True):
                         content = f.read()
                     text_files_content[full_path] = content
                 except (UnicodeDecodeError, IOError):
+                    # Documents are read locally, only media files are uploaded
+                    if document_extractor.can_extract(full_path):
+                        text = document_extractor.extract(full_path)
+                        if text is not None:
+                            text_files_content[full_path] = text
+                            continue
                     mime_type, _ = mimetypes.guess_type(full_path)
                     if mime_type in supported_mime_types:
                         files_to_upload.append(full_path)
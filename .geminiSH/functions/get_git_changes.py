@@ -0,0 +1,182 @@
+"""
+This module provides functionality to load the changes of a git repository
+for the GeminiSH application.
+"""
+
+import os
+import subprocess
+from collections import OrderedDict
+from output_manager import OutputManager
+
+output_manager = OutputManager()
+
+DEBUG = os.getenv("DEBUG")
+
+# (repository, mode, commit SHAs, working tree state, options) -> result
+CACHE = OrderedDict()
+CACHE_SIZE = 32
+
+
+def get_git_changes(
+    directory_path: str = ".",
+    mode: str = "all",
+    base: str = "",
+    context_lines: int = 3,
+):
+    """
+    Get the changed files of a git repository with their diff hunks.
+    Use it to review or work on what changed instead of loading whole folders.
+
+    Parameters:
+    directory_path (str): A path inside the git repository. Default is the current directory.
+    mode (str) 'all' | 'unstaged' | 'staged' | 'branch': Which changes to get.
+        'all': everything not committed (staged, unstaged and new files), the default.
+        'unstaged': the changes not staged yet, and new files.
+        'staged': the changes staged for the next commit.
+        'branch': the commits of the current branch since it diverged from base.
+    base (str): The branch or commit to compare with in 'branch' mode. Default is the
+                default branch of the repository (origin/HEAD, main or master).
+    context_lines (int): The lines of context around every change. Default is 3.
+
+    Returns:
+    str: The diff of every changed file, up to a size budget; the files over the budget
+         are listed with their number of added and removed lines.
+    """
+
+    def run_git(*args):
+        return subprocess.run(
+            ["git", "-C", root, *args], capture_output=True, text=True, check=True
+        ).stdout
+
+    def get_default_base():
+        try:
+            return run_git("symbolic-ref", "--short", "refs/remotes/origin/HEAD").strip()
+        except subprocess.CalledProcessError:
+            pass
+        for branch in ("main", "master"):
+            try:
+                run_git("rev-parse", "--verify", "--quiet", branch)
+                return branch
+            except subprocess.CalledProcessError:
+                continue
+        return "HEAD"
+
+    def get_working_tree_state():
+        # The changed paths with their size and modification time, so an edit not staged
+        # yet still invalidates the cache
+        state = []
+        for entry in run_git("status", "--porcelain", "-z", "--untracked-files=all").split("\0"):
+            path = entry[3:]
+            if not path:
+                continue
+            try:
+                stat = os.stat(os.path.join(root, path))
+                state.append((entry[:2], path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                state.append((entry[:2], path, None, None))
+        return tuple(state)
+
+    def split_files(diff):
+        files = []
+        for chunk in diff.split("\ndiff --git "):
+            if not chunk.strip():
+                continue
+            if not chunk.startswith("diff --git "):
+                chunk = "diff --git " + chunk
+            files.append(chunk.rstrip("\n") + "\n")
+        return files
+
+    def get_untracked_files():
+        diffs = []
+        for path in run_git("ls-files", "--others", "--exclude-standard", "-z").split("\0"):
+            if not path:
+                continue
+            full_path = os.path.join(root, path)
+            try:
+                if os.path.getsize(full_path) > max_chars:
+                    diffs.append(f"diff --git a/{path} b/{path}\nnew file (too large)\n")
+                    continue
+                with open(full_path, "r", encoding="utf-8") as f:
+                    lines = f.read().splitlines()
+            except (UnicodeDecodeError, OSError):
+                diffs.append(f"diff --git a/{path} b/{path}\nnew file (binary or unreadable)\n")
+                continue
+            body = "".join(f"+{line}\n" for line in lines)
+            diffs.append(
+                f"diff --git a/{path} b/{path}\nnew file\n--- /dev/null\n+++ b/{path}\n"
+                f"@@ -0,0 +1,{len(lines)} @@\n{body}"
+            )
+        return diffs
+
+    max_chars = output_manager.config_manager.config["GIT_CHANGES_MAX_CHARS"]
+    context_lines = int(context_lines)
+    try:
+        root = os.path.abspath(directory_path)
+        if os.path.isfile(root):
+            root = os.path.dirname(root)
+        root = run_git("rev-parse", "--show-toplevel").strip()
+        head = run_git("rev-parse", "--verify", "--quiet", "HEAD").strip()
+
+        if mode == "branch":
+            base = base or get_default_base()
+            base_sha = run_git("merge-base", base, "HEAD").strip()
+            diff_args = [f"{base_sha}..{head}"]
+            # Both ends are commits, the result never changes
+            state = ()
+            description = f"branch changes since {base} ({base_sha[:10]})"
+        elif mode in ("all", "unstaged", "staged"):
+            base_sha = None
+            diff_args = {"all": ["HEAD"], "unstaged": [], "staged": ["--cached"]}[mode]
+            state = get_working_tree_state()
+            description = f"{mode} changes"
+        else:
+            return f"[error]Unknown mode: {mode}[/error]"
+
+        key = (root, mode, base_sha, head, state, context_lines, max_chars)
+        if key in CACHE:
+            CACHE.move_to_end(key)
+            return CACHE[key]
+
+        diff = run_git("diff", "--no-color", "--no-ext-diff", f"-U{context_lines}", *diff_args)
+        files = split_files(diff)
+        if mode in ("all", "unstaged"):
+            files.extend(get_untracked_files())
+        stats = {}
+        for line in run_git("diff", "--numstat", *diff_args).splitlines():
+            added, removed, path = line.split("\t", 2)
+            stats[path] = f"+{added} -{removed}"
+
+        included = []
+        skipped = []
+        size = 0
+        for file_diff in files:
+            path = file_diff.split("\n", 1)[0].rsplit(" b/", 1)[-1]
+            if size + len(file_diff) <= max_chars:
+                included.append(file_diff)
+                size += len(file_diff)
+            else:
+                skipped.append(f"{path} ({stats.get(path, 'new file')})")
+
+        if not files:
+            result = f"No {description} in {root}."
+        else:
+            result = f"---Git {description} in {root}, changed files: {len(files)}---\n"
+            result += "".join(included)
+            if skipped:
+                result += (
+                    "[Not included, over the size budget; load them with get_content_file: "
+                    + ", ".join(skipped)
+                    + "]\n"
+                )
+            result += "---End of git changes---"
+
+        CACHE[key] = result
+        if len(CACHE) > CACHE_SIZE:
+            CACHE.popitem(last=False)
+        return result
+    except subprocess.CalledProcessError as e:
+        return f"[error]git {' '.join(e.cmd[3:4])} failed: {(e.stderr or '').strip()}[/error]"
+    except Exception as e:
+        if DEBUG:
+            output_manager.print(e)
+        return f"[error]An error occurred while getting the git changes: {e}[/error]"
@@ -7,9 +7,11 @@ import json
 from datetime import datetime
 from output_manager import OutputManager
 from input_manager import InputManager
+from history_index import HistoryIndex
 
 output_manager = OutputManager()
 input_manager = InputManager()
+history_index = HistoryIndex()
 
 
 def load_chat_history(
@@ -33,10 +35,9 @@ def load_chat_history(
         if not os.path.exists(history_file):
             return f"[error]File {history_file} not found.[/error]"
 
-        with open(history_file, "r", encoding="utf-8") as file:
-            history_data = json.load(file)
-
         if return_all:
+            with open(history_file, "r", encoding="utf-8") as file:
+                history_data = json.load(file)
             try:
                 return {
                     "response": json.dumps(history_data, indent=0),
@@ -45,11 +46,13 @@ def load_chat_history(
             except Exception:
                 return "[error]Error loading history.[/error]"
 
+        # The sessions are listed from the history index, without reading history.json
+        sessions = history_index.get_sessions()
+        session_ids = {session["chat_id"] for session in sessions}
+
         if load_nth_last is not None:
             try:
-                nth_last_chat_id = list(history_data.keys())[
-                    -load_nth_last
-                ]
+                nth_last_chat_id = sessions[-load_nth_last]["chat_id"]
                 return {
                     "response_to_agent": {"load_chat_history": nth_last_chat_id}
                 }
@@ -59,15 +62,14 @@ def load_chat_history(
 
         if not chat_id:
             chat_list = []
-            for cid, chat in history_data.items():
-                first_text = chat["turns"][0]["parts"][0]["text"][:50] + "..."
+            for session in sessions:
                 created_at = datetime.fromisoformat(
-                    chat["created_at"]
+                    session["created_at"]
                 ).strftime("%Y-%m-%d %H:%M:%S")
                 chat_list.append(
                     {
-                        "chat_id": cid,
-                        "preview": first_text,
+                        "chat_id": session["chat_id"],
+                        "preview": (session["preview"] or "(no text)") + "...",
                         "created_at": created_at,
                     }
                 )
@@ -94,7 +96,7 @@ def load_chat_history(
             else:
                 return "[error]Exiting chat selection.[/error]"
 
-        if chat_id in history_data:
+        if chat_id in session_ids:
             return {"response_to_agent": {"load_chat_history": chat_id}}
         else:
             return f"[error]Chat ID {chat_id} not found.[/error]"
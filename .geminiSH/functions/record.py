@@ -1,29 +1,42 @@
 """
-This module provides functionality to record audio from the user's computer 
+This module provides functionality to record audio from the user's computer
 microphone and save it to the cache directory for the GeminiSH application.
+The audio is encoded while it is being captured, so the file is ready to be
+uploaded as soon as the recording stops.
 """
 
 import os
 import uuid
 import queue
-import tempfile
-import soundfile as sf
-import sounddevice as sd
-from pydub import AudioSegment
-from rich.prompt import Prompt
 from output_manager import OutputManager
+from cache_manager import CacheManager
+from lazy_module import LazyModule
+
+sf = LazyModule("soundfile")
+sd = LazyModule("sounddevice")
+rich_prompt = LazyModule("rich.prompt")
 
 output_manager = OutputManager()
+cache_manager = CacheManager()
 
 DEBUG = os.getenv("DEBUG")
 
+RECORD_FORMATS = {
+    "ogg": {"format": "OGG", "subtype": "VORBIS", "extension": ".ogg"},
+    "opus": {"format": "OGG", "subtype": "OPUS", "extension": ".ogg"},
+    "flac": {"format": "FLAC", "subtype": "PCM_16", "extension": ".flac"},
+    "wav": {"format": "WAV", "subtype": "PCM_16", "extension": ".wav"},
+}
+# Sample rates supported by the Opus encoder
+OPUS_SAMPLERATES = [8000, 12000, 16000, 24000, 48000]
+
 
 def record():
     """
     Record audio from the user's computer microphone.
     The user could control when to stop the recording (and could re record if needed).
     If the users want to record an audio or talk to you, execute this function.
-    If the users don't give you clear instructions, check the uploaded record. 
+    If the users don't give you clear instructions, check the uploaded record.
     It probably contains instructions.
 
     Returns:
@@ -33,39 +46,68 @@ def record():
     def callback(indata, unused_frames, unused_time, unused_status):
         q.put(indata.copy())
 
+    def get_available_format(record_format):
+        for fallback in ("ogg", "flac"):
+            # Older libsndfile builds lack Opus/Vorbis support, FLAC is always available
+            if record_format["subtype"] in sf.available_subtypes(record_format["format"]):
+                break
+            record_format = RECORD_FORMATS[fallback]
+        return record_format
+
     q = queue.Queue()
+    config = output_manager.config_manager.config
     try:
         device_info = sd.query_devices(kind="input")
-        samplerate = int(device_info["default_samplerate"])
-        channels = device_info["max_input_channels"]
+        device_samplerate = int(device_info["default_samplerate"])
+        device_channels = device_info["max_input_channels"]
 
-        if channels < 1:
+        if device_channels < 1:
             raise ValueError("The selected device has no input channels available.")
 
-        save_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache")
-
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
-
-        filename = tempfile.mktemp(prefix=f"rec_{uuid.uuid4()}", suffix=".wav", dir=save_path)
-
-        with sf.SoundFile(filename, mode="x", samplerate=samplerate, channels=channels) as file:
+        record_format = get_available_format(
+            RECORD_FORMATS.get(config["RECORD_FORMAT"], RECORD_FORMATS["opus"])
+        )
+        channels = min(config["RECORD_CHANNELS"] or device_channels, device_channels)
+
+        # Capture directly at speech rate when the device supports it, so nothing
+        # needs to be resampled afterwards
+        samplerate = config["RECORD_SAMPLERATE"] or device_samplerate
+        if record_format["subtype"] == "OPUS" and samplerate not in OPUS_SAMPLERATES:
+            samplerate = min(OPUS_SAMPLERATES, key=lambda rate: abs(rate - samplerate))
+        try:
+            sd.check_input_settings(channels=channels, samplerate=samplerate)
+        except Exception:
+            samplerate = device_samplerate
+            if record_format["subtype"] == "OPUS":
+                # Opus cannot encode every device rate, Vorbis (or FLAC) can
+                record_format = get_available_format(RECORD_FORMATS["ogg"])
+
+        filename = cache_manager.get_file_path(f"rec_{uuid.uuid4()}{record_format['extension']}")
+
+        with sf.SoundFile(
+            filename,
+            mode="x",
+            samplerate=samplerate,
+            channels=channels,
+            format=record_format["format"],
+            subtype=record_format["subtype"],
+        ) as file:
             with sd.InputStream(samplerate=samplerate, channels=channels, callback=callback):
-                with output_manager.managed_status(
-                    "[bold yellow]Recording... Press Ctrl+C to stop[/bold yellow]"
-                ):
-                    while True:
-                        file.write(q.get())
-
-    except KeyboardInterrupt:
-        # Convert WAV to MP3
-        audio = AudioSegment.from_wav(filename)
-        mp3_filename = filename.replace(".wav", ".mp3")
-        audio.export(mp3_filename, format="mp3")
-        os.remove(filename)  # Remove the original WAV file
+                try:
+                    with output_manager.managed_status(
+                        "[bold yellow]Recording... Press Ctrl+C to stop[/bold yellow]"
+                    ):
+                        while True:
+                            file.write(q.get())
+                except KeyboardInterrupt:
+                    pass
+            # Encode the blocks captured between the interruption and the stream closing
+            while not q.empty():
+                file.write(q.get_nowait())
+        cache_manager.add(filename)
 
         while True:
-            action = Prompt.ask(
+            action = rich_prompt.Prompt.ask(
                 "[yellow]Do you want to [bold]send[/bold], [bold]re-record[/bold], "
                 "[bold]cancel[/bold] the recording?[/yellow]",
                 choices=["send", "re", "cancel"],
@@ -74,15 +116,16 @@ def record():
             if action == "send":
                 return {
                     "response_to_agent": {
-                        "files_to_upload": [mp3_filename],
+                        "files_to_upload": [filename],
                         "require_execution_result": True,
                     }
                 }
             elif action == "re":
+                cache_manager.remove(filename)
                 output_manager.print("[bold yellow]Re-recording...[/bold yellow]")
                 return record()
             elif action == "cancel":
-                os.remove(mp3_filename)  # Remove the MP3 file
+                cache_manager.remove(filename)
                 return "[info]Recording cancelled[/info]"
 
     except Exception as e:
@@ -1,64 +1,185 @@
 """
-This module provides functionality to take screenshots of one or all monitors 
+This module provides functionality to take screenshots of one or all monitors
 and save them to the cache directory for the GeminiSH application.
+On Windows the whole virtual screen is captured once and cropped per monitor, elsewhere
+every monitor is captured by its own box. Frames are downscaled and compressed before
+saving, and frames identical to the last one uploaded to the same chat for the same monitor
+are not uploaded again.
 """
 
 import os
+import sys
 import uuid
-import pyautogui
-import screeninfo
+import hashlib
+from collections import OrderedDict
 from output_manager import OutputManager
+from cache_manager import CacheManager
+from lazy_module import LazyModule
+from session_manager import get_current_chat_manager
+
+screeninfo = LazyModule("screeninfo")
+Image = LazyModule("PIL.Image")
+ImageGrab = LazyModule("PIL.ImageGrab")
 
 output_manager = OutputManager()
+cache_manager = CacheManager()
 
 DEBUG = os.getenv("DEBUG")
 
+SCREENSHOT_FORMATS = {
+    "webp": {"format": "WEBP", "extension": ".webp"},
+    "jpeg": {"format": "JPEG", "extension": ".jpg"},
+    "png": {"format": "PNG", "extension": ".png"},
+}
+# Chat ID -> {monitor index: (digest, file path) of the last frame sent to that chat}
+LAST_SCREENSHOT_DIGESTS = OrderedDict()
+MAX_TRACKED_CHATS = 64
+
 
-def take_screenshot(monitor_index=None):
+def take_screenshot(monitor_index=None, force: bool = False):
     """
     This function takes a screenshot of one or all monitors and saves it to the cache directory.
     Use it when the user want you to see the screen or asks something that requires a screenshot.
+    Monitors that did not change since the previous screenshot of this chat are not sent again.
+    Frames are compared exactly: any change (even a clock or a blinking cursor) is sent.
 
     Parameters:
     monitor_index (int, optional): If not provided, captures all monitors.
+    force (bool): If True, send the screenshots even if the screen did not change.
+    Only use it when the previous screenshot is no longer available to you.
 
     Returns:
     files: The screenshots taken.
     """
+
+    def get_digest(image):
+        # Exact digest of the pixels: any change, even a new line of text, is a new frame
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{image.mode} {image.size}".encode("utf-8"))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def get_last_digests(chat_manager):
+        # Only the frames sent to the current chat can be skipped; outside of a chat (e.g.
+        # in a worker process) nothing is skipped
+        if chat_manager is None:
+            return {}
+        digests = LAST_SCREENSHOT_DIGESTS.setdefault(chat_manager.chat_id, {})
+        LAST_SCREENSHOT_DIGESTS.move_to_end(chat_manager.chat_id)
+        if len(LAST_SCREENSHOT_DIGESTS) > MAX_TRACKED_CHATS:
+            LAST_SCREENSHOT_DIGESTS.popitem(last=False)
+        return digests
+
+    def was_uploaded(chat_manager, file_path):
+        # The digest is recorded before the upload, which can fail: the frame only counts as
+        # sent if its uploaded file is in the history of the chat
+        with chat_manager.history_lock:
+            chat = chat_manager.chat_history.get(chat_manager.chat_id)
+            turns = chat["turns"] if chat else []
+            return any(
+                part.get("original_path") == file_path
+                for turn in reversed(turns)
+                for part in turn["parts"]
+            )
+
+    config = output_manager.config_manager.config
     try:
+        chat_manager = get_current_chat_manager()
+        last_digests = get_last_digests(chat_manager)
         # Detect the number of screens
         monitors = screeninfo.get_monitors()
         screenshots = []
-        save_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache")
-
-        # Check if the save path exists, if not, create it
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
+        unchanged = []
 
+        monitor_indexes = list(range(len(monitors)))
         if monitor_index is not None:
             # Validate the monitor index
             if monitor_index < 0 or monitor_index >= len(monitors):
                 raise ValueError("Invalid monitor index")
-            monitors = [monitors[monitor_index]]
+            monitor_indexes = [monitor_index]
+
+        image_format = SCREENSHOT_FORMATS.get(
+            config["SCREENSHOT_FORMAT"].lower(), SCREENSHOT_FORMATS["webp"]
+        )
+        max_resolution = config["SCREENSHOT_MAX_RESOLUTION"]
 
         with output_manager.managed_status("[bold yellow]Taking screenshot...[/bold yellow]"):
-            for monitor in monitors:
-                # Generate a UUID for the file name
-                file_name = f"{uuid.uuid4()}.png"
-                file_path = os.path.join(save_path, file_name)
-
-                # Take a screenshot of the specific monitor
-                screenshot = pyautogui.screenshot(
-                    region=(monitor.x, monitor.y, monitor.width, monitor.height)
-                )
-
-                # Save the screenshot
-                screenshot.save(file_path)
+            # Pillow only grabs all the screens at once on Windows: there the virtual screen
+            # is grabbed once and each monitor cropped out of it
+            frame = None
+            if sys.platform == "win32":
+                frame = ImageGrab.grab(all_screens=True)
+                origin_x = min(monitor.x for monitor in monitors)
+                origin_y = min(monitor.y for monitor in monitors)
+                virtual_width = max(monitor.x + monitor.width for monitor in monitors) - origin_x
+                # HiDPI displays are captured in physical pixels, monitors are in logical ones
+                scale = frame.width / virtual_width
+
+            for index in monitor_indexes:
+                monitor = monitors[index]
+                if frame is None:
+                    screenshot = ImageGrab.grab(
+                        bbox=(
+                            monitor.x,
+                            monitor.y,
+                            monitor.x + monitor.width,
+                            monitor.y + monitor.height,
+                        )
+                    )
+                else:
+                    screenshot = frame.crop(
+                        (
+                            round((monitor.x - origin_x) * scale),
+                            round((monitor.y - origin_y) * scale),
+                            round((monitor.x - origin_x + monitor.width) * scale),
+                            round((monitor.y - origin_y + monitor.height) * scale),
+                        )
+                    )
+                if max_resolution:
+                    screenshot.thumbnail(
+                        (max_resolution, max_resolution), Image.BILINEAR, reducing_gap=2.0
+                    )
+
+                digest = get_digest(screenshot)
+                last_digest, last_file_path = last_digests.get(index, (None, None))
+                if (
+                    not force
+                    and config["SCREENSHOT_SKIP_UNCHANGED"]
+                    and last_digest == digest
+                    and was_uploaded(chat_manager, last_file_path)
+                ):
+                    unchanged.append(index)
+                    continue
+
+                file_name = f"screenshot_{index}_{uuid.uuid4()}{image_format['extension']}"
+                file_path = cache_manager.get_file_path(file_name)
+                last_digests[index] = (digest, file_path)
+                if image_format["format"] == "PNG":
+                    screenshot.save(file_path, format="PNG")
+                else:
+                    screenshot.convert("RGB").save(
+                        file_path,
+                        format=image_format["format"],
+                        quality=config["SCREENSHOT_QUALITY"],
+                    )
+                cache_manager.add(file_path)
                 screenshots.append(file_path)
 
-        return {
+        if not screenshots:
+            return (
+                "The screen has not changed since the last screenshot, "
+                "use the previous screenshot."
+            )
+
+        response = {
             "response_to_agent": {"files_to_upload": screenshots, "require_execution_result": True},
         }
+        if unchanged:
+            response["response"] = (
+                f"Monitors {unchanged} have not changed since the last screenshot, "
+                "only the changed monitors are sent."
+            )
+        return response
     except Exception as e:
         if DEBUG:
             output_manager.print(e)
@@ -0,0 +1,27 @@
+"""
+This module provides full-text search over the chat history of the GeminiSH application.
+"""
+
+from history_index import HistoryIndex
+
+history_index = HistoryIndex()
+
+
+def search_chat_history(query: str, limit: int = 20):
+    """
+    Search all the past chat sessions for the given words.
+    Use it when the user refers to something discussed in a previous conversation.
+    To continue one of the found chats, call load_chat_history with its chat id.
+
+    Args:
+        query (str): The words to search for. The last word also matches as a prefix.
+        limit (int, optional): The maximum number of results. Defaults to 20.
+
+    Returns:
+        str: The results ordered by relevance, each one with its chat id, date, turn,
+             role and a snippet of the matching text.
+    """
+    try:
+        return history_index.get_search_markdown(query, limit)
+    except Exception as e:
+        return f"[error]Error searching the chat history: {e}[/error]"
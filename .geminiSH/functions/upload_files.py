@@ -9,12 +9,20 @@ import os
 import mimetypes
 import json
 from datetime import datetime, timedelta
-import google.generativeai as genai
 from output_manager import OutputManager
+from cache_manager import CacheManager
+from telemetry_manager import TelemetryManager
+from lazy_module import LazyModule
+
+genai = LazyModule("google.generativeai")
 
 output_manager = OutputManager()
+cache_manager = CacheManager()
+telemetry_manager = TelemetryManager()
 
 USE_CACHE = False
+# Types guessed by mimetypes under another name than the one the model accepts
+MIME_TYPE_ALIASES = {"audio/x-wav": "audio/wav"}
 
 
 def upload_files(file_paths: list, expiry_time: str = "", force_upload: bool = False) -> dict | str:
@@ -38,6 +46,7 @@ def upload_files(file_paths: list, expiry_time: str = "", force_upload: bool = F
 
     for file_path in file_paths:
         mime_type, _ = mimetypes.guess_type(file_path)
+        mime_type = MIME_TYPE_ALIASES.get(mime_type, mime_type)
 
         if mime_type not in supported_mime_types:
             return f"[error]Unsupported file type: {file_path}[/error]"
@@ -70,13 +79,17 @@ def upload_files(file_paths: list, expiry_time: str = "", force_upload: bool = F
             if cached_file:
                 cached_file["uri"] = cached_file["uri"]
                 output_manager.debug(f"File found in cache: {cached_file}")
+                telemetry_manager.record("upload_file", "upload", cache_hit=True)
                 uploaded_files.append(cached_file)
                 continue
 
         with output_manager.managed_status(
             "[bold yellow]Gemini is uploading a file...[/bold yellow]"
         ):
-            response = genai.upload_file(file_path)
+            with telemetry_manager.span(
+                "upload_file", "upload", bytes_out=os.path.getsize(file_path), cache_hit=False
+            ):
+                response = genai.upload_file(file_path, mime_type=mime_type)
             responses.append(response)
 
         if not expiry_time:
@@ -94,14 +107,17 @@ def upload_files(file_paths: list, expiry_time: str = "", force_upload: bool = F
         uploaded_files.append(file_data)
 
         if output_manager.config_manager.config["REMOVE_CACHE_AFTER_LOAD"]:
-            os.remove(file_path)
-        elif USE_CACHE:
-            # Append new file data to cache
-            cache_data.append(file_data)
-
-            # Save updated cache data
-            with open(cache_file_path, "w", encoding="utf-8") as cache_file:
-                json.dump(cache_data, cache_file, indent=4)
+            cache_manager.remove(file_path)
+        else:
+            # Keep the cached file until its upload expires
+            cache_manager.touch(file_path, expiry_time)
+            if USE_CACHE:
+                # Append new file data to cache
+                cache_data.append(file_data)
+
+                # Save updated cache data
+                with open(cache_file_path, "w", encoding="utf-8") as cache_file:
+                    json.dump(cache_data, cache_file, indent=4)
 
     output_manager.debug(f"Uploaded files: {uploaded_files}")
     return {"response_to_agent": {"files": uploaded_files, "require_execution_result": True}}
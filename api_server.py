@@ -0,0 +1,271 @@
+"""
+This module provides a local HTTP/JSON API for the GeminiSH application.
+It serves the sessions of one agent over HTTP, so other tools can use geminiSH as a shared
+service instead of spawning a CLI process per conversation. Messages can be answered as
+JSON or streamed as Server-Sent Events. Requests are handled concurrently and the
+messages of each session are serialized by the session lock.
+
+Endpoints:
+    GET    /functions                      List the available functions.
+    GET    /sessions                       List the open sessions.
+    POST   /sessions                       Create a session: {"chat_id": optional}.
+    DELETE /sessions/<id>                  Close a session.
+    POST   /sessions/<id>/messages         Send a message: {"message": str, "stream": bool}.
+    GET    /sessions/<id>/history          The turns of the chat of a session.
+    GET    /history                        The chats stored in the history.
+    GET    /history/search?q=<query>       Search the chat history.
+
+Every request needs the token of the server ("Authorization: Bearer <token>"): API_TOKEN,
+or a random token printed at startup when it is not set. Requests from a non-local Origin
+or Host, and request bodies that are not application/json, are refused, so a web page open
+in the browser cannot drive the agent (CSRF or DNS rebinding).
+"""
+
+import hmac
+import json
+import queue
+import secrets
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+
+class ApiServer:
+    """
+    HTTP front end of a GeminiAgent.
+
+    Attributes:
+        agent (GeminiAgent): The agent that processes the messages.
+        host (str): The address the server listens on.
+        port (int): The port the server listens on (0 for an ephemeral port).
+        token (str): Requests must send "Authorization: Bearer <token>"; random if API_TOKEN
+            is not set.
+        allowed_hosts (set): The host names accepted in the Host and Origin headers.
+    """
+
+    LOOPBACK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+    WILDCARD_HOSTS = {"", "0.0.0.0", "::"}
+
+    def __init__(self, agent, host=None, port=None):
+        self.agent = agent
+        config = agent.config_manager.config
+        self.host = config["API_HOST"] if host is None else host
+        self.port = config["API_PORT"] if port is None else port
+        self.token = config["API_TOKEN"]
+        self.generated_token = not self.token
+        if self.generated_token:
+            self.token = secrets.token_urlsafe(32)
+        self.allowed_hosts = set(self.LOOPBACK_HOSTS)
+        if self.host not in self.WILDCARD_HOSTS:
+            self.allowed_hosts.add(self.host.lower())
+        self.httpd = ThreadingHTTPServer((self.host, self.port), self.create_handler())
+        self.httpd.daemon_threads = True
+
+    def serve_forever(self):
+        """Serve requests until shutdown is called."""
+        self.agent.output_manager.print(
+            f"[green]GeminiSH API listening on http://{self.host}:{self.httpd.server_port}[/green]"
+        )
+        if self.generated_token:
+            self.agent.output_manager.print(
+                f"[green]API token (set API_TOKEN to choose it): {self.token}[/green]"
+            )
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+
+    def shutdown(self):
+        """Stop the server."""
+        self.httpd.shutdown()
+
+    def is_allowed_host(self, value, is_origin=False):
+        """Check that a Host or Origin header names this server, and not another site."""
+        if not value:
+            return not is_origin
+        try:
+            url = urlsplit(value if is_origin else f"//{value}")
+            hostname = url.hostname
+        except ValueError:
+            return False
+        if is_origin and url.scheme not in ("http", "https"):
+            return False
+        return hostname is not None and hostname.lower() in self.allowed_hosts
+
+    def is_authorized(self, header):
+        """Check the bearer token of a request, in constant time."""
+        expected = f"Bearer {self.token}".encode("utf-8")
+        return hmac.compare_digest((header or "").encode("utf-8"), expected)
+
+    def create_handler(self):
+        """Return the request handler class bound to this server."""
+        server = self
+
+        class ApiRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                server.agent.output_manager.debug(f"API: {format % args}")
+
+            def do_GET(self):
+                self.dispatch("GET")
+
+            def do_POST(self):
+                self.dispatch("POST")
+
+            def do_DELETE(self):
+                self.dispatch("DELETE")
+
+            def dispatch(self, method):
+                url = urlsplit(self.path)
+                path = [part for part in url.path.split("/") if part]
+                query = parse_qs(url.query)
+                if not server.is_allowed_host(self.headers.get("Host")):
+                    return self.send_json({"error": "Host not allowed"}, 403)
+                if "Origin" in self.headers and not server.is_allowed_host(
+                    self.headers.get("Origin"), True
+                ):
+                    return self.send_json({"error": "Origin not allowed"}, 403)
+                if not server.is_authorized(self.headers.get("Authorization")):
+                    return self.send_json({"error": "Unauthorized"}, 401)
+                try:
+                    body = self.read_body() if method == "POST" else {}
+                except ValueError as e:
+                    return self.send_json({"error": f"Invalid JSON body: {e}"}, 400)
+                try:
+                    server.route(self, method, path, query, body)
+                except Exception as e:
+                    server.agent.output_manager.debug(f"API error: {e}")
+                    self.send_json({"error": str(e)}, 500)
+
+            def read_body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if not length:
+                    return {}
+                data = self.rfile.read(length)
+                # A form or text/plain body can be sent by any web page without a preflight
+                if self.headers.get_content_type() != "application/json":
+                    raise ValueError("the Content-Type must be application/json")
+                body = json.loads(data)
+                if not isinstance(body, dict):
+                    raise ValueError("The body must be a JSON object")
+                return body
+
+            def send_json(self, data, status=200):
+                payload = json.dumps(data, default=str).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def send_events(self, events):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                while True:
+                    event, data = events.get()
+                    self.wfile.write(
+                        f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+                    )
+                    self.wfile.flush()
+                    if event == "done":
+                        break
+
+        return ApiRequestHandler
+
+    def route(self, handler, method, path, query, body):
+        """Dispatch a request to its endpoint."""
+        session_manager = self.agent.session_manager
+        if path == ["functions"] and method == "GET":
+            return handler.send_json({"functions": self.get_functions()})
+
+        if path == ["sessions"]:
+            if method == "GET":
+                sessions = session_manager.list_sessions()
+                return handler.send_json(
+                    {"sessions": [self.get_session_info(session) for session in sessions]}
+                )
+            if method == "POST":
+                session = session_manager.create_session(body.get("chat_id"))
+                return handler.send_json(self.get_session_info(session), 201)
+
+        if len(path) >= 2 and path[0] == "sessions":
+            session = session_manager.get_session(path[1])
+            if session is None:
+                return handler.send_json({"error": f"Session {path[1]} not found"}, 404)
+            if len(path) == 2 and method == "DELETE":
+                session_manager.close_session(session.session_id)
+                return handler.send_json({"closed": session.session_id})
+            if path[2:] == ["messages"] and method == "POST":
+                return self.post_message(handler, session, body)
+            if path[2:] == ["history"] and method == "GET":
+                chat_manager = session.chat_manager
+                with chat_manager.history_lock:
+                    chat = chat_manager.chat_history.get(session.session_id)
+                    turns = json.loads(json.dumps(chat["turns"])) if chat else []
+                for turn in turns:
+                    for part in turn["parts"]:
+                        if "response_blob" in part.get("function_response", {}):
+                            part["function_response"] = {
+                                "name": part["function_response"]["name"],
+                                "response": chat_manager.get_response(part["function_response"]),
+                            }
+                return handler.send_json({"session_id": session.session_id, "turns": turns})
+
+        history_index = self.agent.chat_manager.history_index
+        if path == ["history"] and method == "GET":
+            return handler.send_json({"chats": history_index.get_sessions()})
+        if path == ["history", "search"] and method == "GET":
+            try:
+                limit = int(query.get("limit", ["20"])[0])
+            except ValueError:
+                return handler.send_json({"error": "The limit must be an integer"}, 400)
+            if limit < 1:
+                return handler.send_json({"error": "The limit must be positive"}, 400)
+            results = history_index.search(query.get("q", [""])[0], limit)
+            return handler.send_json({"results": results})
+
+        return handler.send_json({"error": "Not found"}, 404)
+
+    def post_message(self, handler, session, body):
+        """Process a message in a session, answering with JSON or streaming its events."""
+        message = body.get("message")
+        if not isinstance(message, str) or not message.strip():
+            return handler.send_json({"error": "The message is required"}, 400)
+
+        accept = handler.headers.get("Accept", "")
+        if not (body.get("stream") or "text/event-stream" in accept):
+            output = session.process_message(message)
+            return handler.send_json({"session_id": session.session_id, "output": output})
+
+        events = queue.Queue()
+
+        def process():
+            try:
+                session.process_message(message, events)
+            except Exception as e:
+                # The error and done events were already sent to the stream
+                self.agent.output_manager.debug(f"API error: {e}")
+
+        threading.Thread(target=process, daemon=True).start()
+        return handler.send_events(events)
+
+    def get_functions(self):
+        """Return the name and description of every function."""
+        return [
+            {"name": name, "description": (function.__doc__ or "").strip()}
+            for name, function in self.agent.function_manager.functions.items()
+        ]
+
+    def get_session_info(self, session):
+        """Return the JSON description of a session."""
+        return {
+            "session_id": session.session_id,
+            "created_at": session.created_at,
+            "status": session.status,
+            "busy": session.lock.locked(),
+        }
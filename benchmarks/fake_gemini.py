@@ -0,0 +1,132 @@
+"""
+This module provides a local stand-in for the Google Gemini backend.
+It replaces `genai.GenerativeModel`, `genai.upload_file` and `genai.configure` with fakes
+that replay scripted responses (text and function calls), so every path through the
+ModelManager can run offline and deterministically.
+"""
+
+import copy
+import time
+import mimetypes
+import google.generativeai as genai
+
+
+class FakeResponse:
+    """A response with the same dict layout as `GenerateContentResponse.to_dict()`."""
+
+    def __init__(self, parts, prompt_token_count=0):
+        self._data = {
+            "candidates": [{"content": {"role": "model", "parts": parts}, "finish_reason": 1}],
+            "usage_metadata": {
+                "prompt_token_count": prompt_token_count,
+                "candidates_token_count": sum(len(str(part)) // 4 for part in parts),
+            },
+        }
+
+    def __iter__(self):
+        """Streamed responses are returned as a single chunk."""
+        yield self
+
+    @staticmethod
+    def to_dict(response):
+        """Return the response as a dict, like the real response type does."""
+        return copy.deepcopy(response._data)
+
+
+class FakeFile:
+    """An uploaded file, as returned by `genai.upload_file`."""
+
+    def __init__(self, uri, mime_type):
+        self.uri = uri
+        self.mime_type = mime_type
+
+    def to_dict(self):
+        """Return the file metadata as a dict."""
+        return {"uri": self.uri, "mime_type": self.mime_type}
+
+
+class FakeGenerativeModel:
+    """Stand-in for `genai.GenerativeModel` that answers from the FakeGemini script."""
+
+    def __init__(self, model_name, backend=None, **kwargs):
+        self.model_name = model_name
+        self.backend = backend
+        self.kwargs = kwargs
+
+    def generate_content(self, contents, **unused_kwargs):
+        """Return the next scripted response."""
+        return self.backend.next_response(contents)
+
+
+class FakeGemini:
+    """
+    Scripted fake of the Gemini backend.
+
+    Attributes:
+        latency (float): Seconds to sleep on every request, to simulate the network.
+        script (list): Pending responses, each one a list of parts.
+        requests (list): Number of contents sent on every request.
+        uploads (list): Paths of the uploaded files.
+    """
+
+    DEFAULT_TEXT = "OK."
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.script = []
+        self.requests = []
+        self.uploads = []
+        self._originals = {}
+
+    @staticmethod
+    def text(text):
+        """Build a text response."""
+        return [{"text": text}]
+
+    @staticmethod
+    def function_call(name, args=None, text=None):
+        """Build a function call response, optionally preceded by a text part."""
+        parts = [{"text": text}] if text else []
+        parts.append({"function_call": {"name": name, "args": args or {}}})
+        return parts
+
+    def add(self, *responses):
+        """Append responses to the script."""
+        self.script.extend(responses)
+
+    def next_response(self, contents):
+        """Pop the next scripted response, or a plain text once the script is exhausted."""
+        self.requests.append(len(contents))
+        if self.latency:
+            time.sleep(self.latency)
+        parts = self.script.pop(0) if self.script else self.text(self.DEFAULT_TEXT)
+        return FakeResponse(parts, prompt_token_count=len(contents))
+
+    def upload_file(self, path, mime_type=None, **unused_kwargs):
+        """Fake `genai.upload_file`."""
+        self.uploads.append(path)
+        mime_type = mime_type or mimetypes.guess_type(path)[0]
+        return FakeFile(f"https://fake.gemini/files/{len(self.uploads)}", mime_type)
+
+    def install(self):
+        """Patch the genai module so the managers and functions use this backend."""
+        backend = self
+
+        class BoundFakeGenerativeModel(FakeGenerativeModel):
+            def __init__(self, model_name, **kwargs):
+                super().__init__(model_name, backend=backend, **kwargs)
+
+        for name, replacement in (
+            ("GenerativeModel", BoundFakeGenerativeModel),
+            ("upload_file", self.upload_file),
+            ("configure", lambda **unused_kwargs: None),
+        ):
+            self._originals.setdefault(name, getattr(genai, name))
+            setattr(genai, name, replacement)
+        return self
+
+    def uninstall(self):
+        """Restore the original genai attributes."""
+        for name, original in self._originals.items():
+            setattr(genai, name, original)
+        self._originals = {}
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+This module runs the offline benchmark suite of the GeminiSH application.
+The Gemini backend is replaced by the FakeGemini stand-in and the agent runs in a
+temporary agent directory, so no API key is needed and the real history is untouched.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--output results.json] [--compare baseline.json]
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import difflib
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_gemini import FakeGemini  # noqa: E402
+
+# Relative change over the baseline reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+
+class BenchmarkRunner:
+    """
+    Runs the benchmarks and collects their results.
+
+    Attributes:
+        repeat (int): Number of repetitions of every measurement (the median is kept).
+        results (dict): Metric name -> {"value", "unit", "lower_is_better"}.
+    """
+
+    def __init__(self, repeat=5):
+        self.repeat = repeat
+        self.results = {}
+        self.work_directory = tempfile.mkdtemp(prefix="geminiSH_bench_")
+        self.backend = None
+        self.agent = None
+        self.create_agent_directory()
+
+    def add_result(self, name, value, unit="s", lower_is_better=True):
+        """Store the result of a metric."""
+        self.results[name] = {"value": value, "unit": unit, "lower_is_better": lower_is_better}
+        print(f"{name}: {value:.6f} {unit}")
+
+    def measure(self, func, setup=None):
+        """Return the median duration of func over the configured repetitions."""
+        durations = []
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - start)
+        return statistics.median(durations)
+
+    def create_agent_directory(self):
+        """Create the temporary agent directory, so history is not written to the real one."""
+        agent_directory = os.path.join(self.work_directory, ".geminiSH")
+        os.makedirs(os.path.join(agent_directory, "functions"), exist_ok=True)
+        with open(os.path.join(agent_directory, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"GOOGLE_API_KEY": "fake"}, f)
+
+    def create_agent(self):
+        """Create an agent on the fake backend inside the temporary agent directory."""
+        os.chdir(self.work_directory)
+
+        from gemini_agent import GeminiAgent
+
+        self.backend = FakeGemini().install()
+        self.agent = GeminiAgent()
+        self.agent.model_manager.wait_until_ready()
+        self.agent.output_manager.console.quiet = True
+        return self.agent
+
+    def bench_startup(self):
+        """
+        Time to import the agent, to build the managers (time to prompt) and until the
+        background initialization finished, in a fresh interpreter.
+        """
+        import_times, init_times, ready_times = [], [], []
+        for _ in range(self.repeat):
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--startup-child"],
+                cwd=self.work_directory,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            timings = json.loads(result.stdout.strip().splitlines()[-1])
+            import_times.append(timings["import"])
+            init_times.append(timings["init"])
+            ready_times.append(timings["ready"])
+        self.add_result("startup.import", statistics.median(import_times))
+        self.add_result("startup.init", statistics.median(init_times))
+        self.add_result("startup.ready", statistics.median(ready_times))
+
+    def bench_turns(self, turns=50):
+        """Per-turn overhead of the agent, with a zero latency backend."""
+        agent = self.create_agent()
+        sample_file = os.path.join(self.work_directory, "sample.txt")
+        with open(sample_file, "w", encoding="utf-8") as f:
+            f.write("Benchmark sample line.\n" * 200)
+
+        def text_turns():
+            for _ in range(turns):
+                agent.process_message("Hello")
+
+        def function_turns():
+            for _ in range(turns):
+                self.backend.add(
+                    FakeGemini.function_call("get_content_file", {"file_path": sample_file}),
+                    FakeGemini.text("Done."),
+                )
+                agent.process_message("Read the sample file")
+
+        def new_chat():
+            agent.chat_manager.chat_id = f"bench-{time.perf_counter_ns()}"
+            agent.chat_manager.current_chat = []
+
+        self.add_result("turn.text", self.measure(text_turns, new_chat) / turns)
+        self.add_result("turn.function_call", self.measure(function_turns, new_chat) / turns)
+
+    def bench_history_save(self, session_counts=(10, 100, 1000), turns_per_session=20):
+        """Cost of saving the history as the number of stored sessions grows."""
+        chat_manager = self.agent.chat_manager
+        for count in session_counts:
+            chat_manager.chat_history = {
+                f"session-{i}": {
+                    "created_at": datetime.now().isoformat(),
+                    "turns": [
+                        {
+                            "role": "user" if turn % 2 == 0 else "model",
+                            "parts": [{"text": f"Message {turn} of session {i}. " * 10}],
+                        }
+                        for turn in range(turns_per_session)
+                    ],
+                }
+                for i in range(count)
+            }
+            self.add_result(
+                f"history.save.{count}_sessions", self.measure(chat_manager.save_chat_history)
+            )
+        chat_manager.chat_history = {}
+
+    def bench_folder_ingest(self, file_count=500, file_size=8192):
+        """Throughput of get_content_of_folder over a generated tree."""
+        folder = os.path.join(self.work_directory, "ingest")
+        for i in range(file_count):
+            sub_folder = os.path.join(folder, f"dir_{i % 20}")
+            os.makedirs(sub_folder, exist_ok=True)
+            with open(os.path.join(sub_folder, f"file_{i}.py"), "w", encoding="utf-8") as f:
+                f.write(("x = 1  # padding\n" * (file_size // 17 + 1))[:file_size])
+
+        get_content_of_folder = self.agent.function_manager.functions["get_content_of_folder"]
+        duration = self.measure(lambda: get_content_of_folder(folder))
+        megabytes = file_count * file_size / (1024 * 1024)
+        self.add_result("folder_ingest.throughput", megabytes / duration, "MB/s", False)
+
+    def bench_diff_apply(self, line_count=20000, change_every=50):
+        """Speed of apply_diff_changes on a large file with many hunks."""
+        file_path = os.path.join(self.work_directory, "diff_target.py")
+        original = [f"value_{i} = {i}\n" for i in range(line_count)]
+        modified = [
+            f"value_{i} = {i * 2}\n" if i % change_every == 0 else line
+            for i, line in enumerate(original)
+        ]
+        diff_text = "".join(
+            difflib.unified_diff(original, modified, fromfile=file_path, tofile=file_path)
+        )
+
+        def reset_file():
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.writelines(original)
+
+        apply_diff_changes = self.agent.function_manager.functions["apply_diff_changes"]
+        self.add_result(
+            "diff_apply.duration",
+            self.measure(lambda: apply_diff_changes(file_path, diff_text), reset_file),
+        )
+
+    def run(self):
+        """Run every benchmark."""
+        self.bench_startup()
+        self.bench_turns()
+        self.bench_history_save()
+        self.bench_folder_ingest()
+        self.bench_diff_apply()
+        self.backend.uninstall()
+        return {
+            "metadata": {
+                "created_at": datetime.now().isoformat(),
+                "python_version": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": self.repeat,
+            },
+            "results": self.results,
+        }
+
+
+def compare(results, baseline_path):
+    """Print the change of every metric against a baseline results file."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for name, result in results["results"].items():
+        if name not in baseline or not baseline[name]["value"]:
+            continue
+        change = (result["value"] - baseline[name]["value"]) / baseline[name]["value"]
+        if not result["lower_is_better"]:
+            change = -change
+        status = "REGRESSION" if change > REGRESSION_THRESHOLD else "ok"
+        if status == "REGRESSION":
+            regressions.append(name)
+        print(f"{name}: {change:+.1%} {status}")
+    return regressions
+
+
+def startup_child():
+    """Measure import and init time of the agent in this (fresh) interpreter."""
+    start = time.perf_counter()
+    import gemini_agent
+
+    imported = time.perf_counter()
+    FakeGemini().install()
+    sys.stdout = io.StringIO()
+    agent = gemini_agent.GeminiAgent()
+    initialized = time.perf_counter()
+    agent.model_manager.wait_until_ready()
+    sys.stdout = sys.__stdout__
+    print(
+        json.dumps(
+            {
+                "import": imported - start,
+                "init": initialized - imported,
+                "ready": time.perf_counter() - imported,
+            }
+        )
+    )
+
+
+def main():
+    """Parse the arguments and run the benchmarks."""
+    parser = argparse.ArgumentParser(description="Offline benchmarks for GeminiSH.")
+    parser.add_argument("--output", default="bench_results.json", help="Results JSON file.")
+    parser.add_argument("--compare", help="Baseline results JSON file to compare with.")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per measurement.")
+    parser.add_argument("--startup-child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.startup_child:
+        startup_child()
+        return
+
+    output_path = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    results = BenchmarkRunner(repeat=args.repeat).run()
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+    print(f"Results saved to {output_path}")
+
+    if baseline_path and compare(results, baseline_path):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+This module stores the large function responses of the chat history of the GeminiSH
+application. Instead of keeping them verbatim in history.json, every payload is written
+once to a compressed file named by the SHA-256 of its content, and the turn only keeps a
+reference to it. Identical payloads (e.g. the same folder loaded in several sessions) are
+stored only once. Blobs are compressed with zstd when the zstandard package is installed,
+and with zlib otherwise; both can be read back.
+"""
+
+import os
+import zlib
+import hashlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class BlobStore:
+    """
+    Content-addressed store of compressed texts.
+
+    Attributes:
+        directory (str): The directory of the blobs, one subdirectory per hash prefix.
+        output_manager (OutputManager, optional): Used to log the blobs that cannot be read.
+    """
+
+    BLOBS_DIR = "blobs"
+    ZSTD_EXTENSION = ".zst"
+    ZLIB_EXTENSION = ".zz"
+
+    def __init__(self, directory, output_manager=None):
+        self.directory = os.path.join(directory, self.BLOBS_DIR)
+        self.output_manager = output_manager
+
+    def get_path(self, key, extension):
+        """Return the path of a blob."""
+        return os.path.join(self.directory, key[:2], key + extension)
+
+    def put(self, text):
+        """
+        Store a text, unless a blob with the same content already exists.
+
+        Returns:
+            str: The key of the blob, i.e. the SHA-256 of the text.
+        """
+        data = text.encode("utf-8")
+        key = hashlib.sha256(data).hexdigest()
+        for extension in (self.ZSTD_EXTENSION, self.ZLIB_EXTENSION):
+            if os.path.exists(self.get_path(key, extension)):
+                return key
+
+        if zstandard:
+            path = self.get_path(key, self.ZSTD_EXTENSION)
+            compressed = zstandard.ZstdCompressor(level=3).compress(data)
+        else:
+            path = self.get_path(key, self.ZLIB_EXTENSION)
+            compressed = zlib.compress(data, 6)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(temp_path, path)
+        return key
+
+    def get(self, key):
+        """
+        Return the text of a blob, or None if it does not exist or cannot be read, e.g. a
+        corrupt blob or a zstd blob (from a history copied from another machine) without the
+        zstandard package.
+        """
+        errors = (OSError, zlib.error, UnicodeDecodeError)
+        if zstandard is not None:
+            errors += (zstandard.ZstdError,)
+        path = self.get_path(key, self.ZSTD_EXTENSION)
+        if os.path.exists(path):
+            if zstandard is not None:
+                try:
+                    with open(path, "rb") as f:
+                        return zstandard.ZstdDecompressor().decompress(f.read()).decode("utf-8")
+                except errors as e:
+                    self.debug(f"The blob {key} cannot be read: {e}")
+            else:
+                self.debug(
+                    f"The blob {key} is compressed with zstd, install geminiSH[zstd] to read it"
+                )
+        path = self.get_path(key, self.ZLIB_EXTENSION)
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    return zlib.decompress(f.read()).decode("utf-8")
+            except errors as e:
+                self.debug(f"The blob {key} cannot be read: {e}")
+        return None
+
+    def debug(self, message):
+        """Log a debug message, if there is an output manager."""
+        if self.output_manager:
+            self.output_manager.debug(message)
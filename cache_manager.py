@@ -0,0 +1,262 @@
+"""
+This module manages the cache directory of the GeminiSH application.
+Downloads, recordings and screenshots are written to the cache directory before being
+uploaded. The CacheManager keeps an index of those files (size, last access and upload
+expiry time) and evicts them by TTL and LRU so the directory stays under a size quota
+without having to scan it. The function workers run in other processes and share the
+index file: every change reloads the index under a file lock, so their changes are merged.
+"""
+
+import os
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from config_manager import ConfigManager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class CacheManager:
+    """
+    Manages the files stored in the cache directory.
+    This class is designed as a singleton so function modules can share the same index.
+
+    Attributes:
+        CACHE_DIR (str): The name of the cache directory inside the default directory.
+        INDEX_FILE_NAME (str): The name of the index file inside the cache directory.
+        directory (str): The absolute path of the cache directory.
+        index (dict): File name -> {"size", "last_access", "expiry_time"}.
+        total_size (int): The sum of the sizes of the indexed files, in bytes.
+    """
+
+    CACHE_DIR = "cache"
+    INDEX_FILE_NAME = "index.json"
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, config_manager=None, output_manager=None):
+        if not hasattr(self, "initialized"):
+            # Built from the configuration when a function module is loaded first
+            self.config_manager = config_manager or ConfigManager()
+            self.output_manager = output_manager
+            self.directory = os.path.realpath(
+                os.path.join(self.config_manager.get_directory(), self.CACHE_DIR)
+            )
+            self.index_file = os.path.join(self.directory, self.INDEX_FILE_NAME)
+            self._lock = threading.RLock()
+            self._lock_depth = 0
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            self.index = self.load_index()
+            self.total_size = sum(entry["size"] for entry in self.index.values())
+            self.initialized = True
+            self.evict()
+
+    def read_index(self):
+        """Read the cache index file, or return None if it does not exist or is invalid."""
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (ValueError, OSError):
+            return None
+        return index if isinstance(index, dict) else None
+
+    def load_index(self):
+        """Load the cache index, building it from the directory the first time."""
+        index = self.read_index()
+        if index is not None:
+            return index
+        # Adopt the files written before the index existed
+        index = {}
+        now = datetime.now().isoformat()
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith(self.INDEX_FILE_NAME):
+                index[entry.name] = {
+                    "size": entry.stat().st_size,
+                    "last_access": now,
+                    "expiry_time": None,
+                }
+        self._write_index(index)
+        return index
+
+    def save_index(self):
+        """Save the cache index to disk."""
+        with self._lock:
+            self._write_index(self.index)
+
+    @contextmanager
+    def locked_index(self):
+        """
+        Lock the index to change it, against the threads and the other processes (the
+        function workers). The index is reloaded from disk first, so the changes of the
+        other processes are kept, and written when the block ends.
+        """
+        with self._lock:
+            if self._lock_depth:
+                # Already locked by this thread, e.g. evict called by add
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(f"{self.index_file}.lock", "a+", encoding="utf-8") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                self._lock_depth = 1
+                try:
+                    index = self.read_index()
+                    if index is not None:
+                        self.index = index
+                        self.total_size = sum(entry["size"] for entry in index.values())
+                    yield
+                    self.save_index()
+                finally:
+                    self._lock_depth = 0
+                    if fcntl:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    else:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _write_index(self, index):
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=4)
+        os.replace(temp_file, self.index_file)
+
+    def get_file_path(self, file_name):
+        """Return the path where a new cache file with the given name should be written."""
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        return os.path.join(self.directory, os.path.basename(file_name))
+
+    def get_key(self, file_path):
+        """Return the index key of a file, or None if the file is not in the cache directory."""
+        real_path = os.path.realpath(file_path)
+        if os.path.dirname(real_path) == self.directory:
+            return os.path.basename(real_path)
+        return None
+
+    def is_cached(self, file_path):
+        """Check if a file is stored in the cache directory."""
+        return self.get_key(file_path) is not None
+
+    def add(self, file_path):
+        """Register a file written to the cache directory and evict old files if needed."""
+        key = self.get_key(file_path)
+        if key is None or not os.path.exists(file_path):
+            return
+        with self.locked_index():
+            if key in self.index:
+                self.total_size -= self.index[key]["size"]
+            size = os.path.getsize(file_path)
+            self.index[key] = {
+                "size": size,
+                "last_access": datetime.now().isoformat(),
+                "expiry_time": None,
+            }
+            self.total_size += size
+            self.evict(keep=[key])
+
+    def touch(self, file_path, expiry_time=None):
+        """Mark a cached file as recently used, optionally storing its upload expiry time."""
+        key = self.get_key(file_path)
+        with self.locked_index():
+            if key not in self.index:
+                return
+            self.index[key]["last_access"] = datetime.now().isoformat()
+            if expiry_time:
+                self.index[key]["expiry_time"] = self.normalize_time(expiry_time)
+
+    @staticmethod
+    def normalize_time(value):
+        """
+        Return an ISO time as naive local time, the time of every entry of the index, so it
+        can be compared with datetime.now(). None if the time is not valid.
+        """
+        try:
+            time = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if time.tzinfo is not None:
+            time = time.astimezone().replace(tzinfo=None)
+        return time.isoformat()
+
+    def remove(self, file_path):
+        """Delete a cached file and remove it from the index."""
+        key = self.get_key(file_path)
+        if key is None:
+            return
+        with self.locked_index():
+            self._remove_key(key)
+
+    def _remove_key(self, key):
+        entry = self.index.pop(key, None)
+        if entry:
+            self.total_size -= entry["size"]
+        try:
+            os.remove(os.path.join(self.directory, key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            if self.output_manager:
+                self.output_manager.debug(f"Error removing cached file {key}: {e}")
+
+    def evict(self, keep=()):
+        """
+        Evict cached files.
+
+        Files whose upload already expired, or that were never uploaded and have not been
+        used for CACHE_TTL_HOURS, are removed first. Then the least recently used files
+        are removed until the cache is under CACHE_MAX_SIZE_MB.
+
+        Args:
+            keep (list, optional): Keys that must not be evicted.
+        """
+        config = self.config_manager.config
+        max_size = config["CACHE_MAX_SIZE_MB"] * 1024 * 1024
+        ttl = timedelta(hours=config["CACHE_TTL_HOURS"])
+        now = datetime.now()
+        with self.locked_index():
+            evicted = []
+            for key, entry in list(self.index.items()):
+                if key in keep:
+                    continue
+                try:
+                    if entry["expiry_time"]:
+                        expired = datetime.fromisoformat(entry["expiry_time"]) < now
+                    else:
+                        expired = datetime.fromisoformat(entry["last_access"]) + ttl < now
+                except (ValueError, TypeError):
+                    # An invalid or timezone-aware time from an older index
+                    expired = True
+                if expired:
+                    self._remove_key(key)
+                    evicted.append(key)
+
+            if max_size and self.total_size > max_size:
+                lru_keys = sorted(
+                    (key for key in self.index if key not in keep),
+                    key=lambda key: self.index[key]["last_access"],
+                )
+                for key in lru_keys:
+                    if self.total_size <= max_size:
+                        break
+                    self._remove_key(key)
+                    evicted.append(key)
+
+            if evicted and self.output_manager:
+                self.output_manager.debug(f"Evicted cached files: {evicted}")
@@ -10,10 +10,18 @@ seamless user interactions and state management.
 import os
 import uuid
 import json
+import difflib
+import threading
 
 from datetime import datetime
-from google.protobuf.struct_pb2 import Struct
-from google.ai.generativelanguage import FunctionCall, FunctionResponse, Content, Part, FileData
+from lazy_module import LazyModule
+from telemetry_manager import TelemetryManager
+from history_index import HistoryIndex
+from history_writer import HistoryWriter
+from blob_store import BlobStore
+
+struct_pb2 = LazyModule("google.protobuf.struct_pb2")
+glm = LazyModule("google.ai.generativelanguage")
 
 FIRST_RUN_THRESHOLD = int(os.getenv("FIRST_RUN_THRESHOLD", 10))
 
@@ -28,16 +36,49 @@ class ChatManager:
     seamless user interactions and state management.
     """
     HISTORY_FILE_NAME = "history.json"
+    # Characters of a response moved to the blob store that stay in the history
+    BLOB_PREVIEW_CHARS = 500
+    # Shared by the chat managers of every session, which write the same history
+    history_lock = threading.RLock()
 
-    def __init__(self, config_manager, output_manager, input_manager, state_manager):
+    def __init__(
+        self,
+        config_manager,
+        output_manager,
+        input_manager,
+        state_manager,
+        chat_history=None,
+        history_writer=None,
+    ):
         self.config_manager = config_manager
         self.output_manager = output_manager
         self.input_manager = input_manager
         self.state_manager = state_manager
+        self.telemetry_manager = TelemetryManager()
 
-        self.chat_history = self.check_chat_history()
+        self.history_index = HistoryIndex(config_manager, output_manager)
+        if chat_history is None:
+            self.chat_history = self.check_chat_history()
+            self.history_index.sync(self.chat_history)
+        else:
+            # The chat manager of a session shares the history of the agent
+            self.chat_history = chat_history
+        # Shared too, so the parts of every session are written by the same group commits
+        self.history_writer = history_writer or HistoryWriter(
+            config_manager, self.get_history_file(), self, self.history_lock
+        )
+        self.blob_store = BlobStore(
+            os.path.dirname(self.get_history_file()), self.output_manager
+        )
+        if chat_history is None and self.store_large_responses():
+            # Move the payloads of a history written before the blob store out of it
+            self.history_writer.mark_dirty()
         self.chat_id = str(uuid.uuid4())
         self.current_chat = []
+        # (id of a Content, its part count, is old) -> (the Content, its compacted copy or None)
+        self.compacted_contents = {}
+        # Path -> {"content": last version sent, "base": Content with the full version}
+        self.file_versions = {}
 
     def check_chat_history(self):
         """Load chat history from the history.json file."""
@@ -55,12 +96,22 @@ class ChatManager:
 
                 except json.JSONDecodeError:
                     chat_history = {}
-                if (
-                    not self.config_manager.is_agent
-                    and len(chat_history.keys()) <= FIRST_RUN_THRESHOLD
-                ):
-                    self.state_manager.set_first_run(True)
-                return chat_history
+                    corrupt = True
+                else:
+                    corrupt = False
+            if corrupt:
+                # Keep the unreadable file instead of overwriting it with the next write
+                backup_file = f"{history_file}.corrupt-{datetime.now():%Y%m%d%H%M%S}"
+                os.replace(history_file, backup_file)
+                self.output_manager.warning(
+                    f"The chat history could not be read, it was moved to {backup_file}"
+                )
+            if (
+                not self.config_manager.is_agent
+                and len(chat_history.keys()) <= FIRST_RUN_THRESHOLD
+            ):
+                self.state_manager.set_first_run(True)
+            return chat_history
         else:
             with open(history_file, "w", encoding="utf-8") as f:
                 json.dump({}, f, indent=0)
@@ -72,17 +123,83 @@ class ChatManager:
         """Creates a new chat."""
         self.chat_history[self.chat_id] = {"turns": [], "created_at": datetime.now().isoformat()}
 
-    def save_chat_history(self):
-        """Save chat history to the history.json file."""
+    def get_history_file(self):
+        """Return the path of the history.json file."""
         if self.config_manager.is_agent:
-            history_file = os.path.join(self.config_manager.agent_directory, self.HISTORY_FILE_NAME)
-        else:
-            history_file = os.path.join(self.config_manager.directory, self.HISTORY_FILE_NAME)
-        with open(history_file, "w", encoding="utf-8") as f:
-            json.dump(self.chat_history, f, indent=4)
+            return os.path.join(self.config_manager.agent_directory, self.HISTORY_FILE_NAME)
+        return os.path.join(self.config_manager.directory, self.HISTORY_FILE_NAME)
+
+    def save_chat_history(self):
+        """Save chat history to the history.json file now."""
+        with self.history_lock, self.telemetry_manager.span("save_chat_history", "history") as span:
+            span["bytes_out"] = self.history_writer.write()
+
+    def flush_chat_history(self):
+        """Save the changes of the chat history, e.g. at the end of a turn."""
+        if not self.history_writer.dirty:
+            return
+        with self.telemetry_manager.span("flush_chat_history", "history") as span:
+            span["bytes_out"] = self.history_writer.flush()
 
     def add_part(self, part, proto_part, role, save=True):
         """Add a new part to the chat history."""
+        with self.history_lock:
+            self._add_part(part, proto_part, role, save)
+
+    def store_response(self, part):
+        """
+        Return the part to keep in the history for a part: the same part, or for a large
+        function response, a reference to its payload in the blob store.
+        """
+        response = part.get("function_response", {}).get("response")
+        if response is None:
+            return part
+        is_text = isinstance(response, str)
+        text = response if is_text else json.dumps(response, ensure_ascii=False)
+        if len(text) < self.config_manager.config["HISTORY_BLOB_MIN_CHARS"]:
+            return part
+        try:
+            key = self.blob_store.put(text)
+        except OSError as e:
+            self.output_manager.debug(f"Error storing a function response: {e}")
+            return part
+        reference = {
+            "name": part["function_response"]["name"],
+            "response_blob": key,
+            "size": len(text),
+            "preview": text[: self.BLOB_PREVIEW_CHARS],
+        }
+        if not is_text:
+            reference["response_type"] = "json"
+        return {"function_response": reference}
+
+    def store_large_responses(self):
+        """Move the large function responses of the history to the blob store."""
+        changed = False
+        with self.history_lock:
+            for chat in self.chat_history.values():
+                for turn in chat["turns"]:
+                    for index, part in enumerate(turn["parts"]):
+                        stored_part = self.store_response(part)
+                        if stored_part is not part:
+                            turn["parts"][index] = stored_part
+                            changed = True
+        return changed
+
+    def get_response(self, function_response):
+        """Return the response of a function response of the history, loading its blob."""
+        if "response_blob" not in function_response:
+            return function_response["response"]
+        text = self.blob_store.get(function_response["response_blob"])
+        if text is None:
+            return f"[The stored result is missing]\n{function_response.get('preview', '')}"
+        if function_response.get("response_type") == "json":
+            return json.loads(text)
+        return text
+
+    def _add_part(self, part, proto_part, role, save):
+        indexed_part = part
+        part = self.store_response(part)
         if self.chat_history and self.chat_id in self.chat_history:
             last_turns = self.chat_history[self.chat_id]["turns"]
 
@@ -91,44 +208,51 @@ class ChatManager:
                 self.current_chat[-1].parts.append(proto_part)
                 last_turns[-1]["parts"].append(part)
             else:
-                self.current_chat.append(Content(parts=[proto_part], role=role))
+                self.current_chat.append(glm.Content(parts=[proto_part], role=role))
                 last_turns.append({"role": role, "parts": [part]})
+            self.index_part(indexed_part, role)
             if save:
-                self.save_chat_history()
+                self.history_writer.mark_dirty()
         else:
             self.create_chat()
             self.chat_history[self.chat_id]["turns"].append({"role": role, "parts": [part]})
-            self.current_chat.append(Content(parts=[proto_part], role=role))
-            self.save_chat_history()
+            self.current_chat.append(glm.Content(parts=[proto_part], role=role))
+            self.index_part(indexed_part, role)
+            self.history_writer.mark_dirty()
+
+    def index_part(self, part, role):
+        """Add a part of the current chat to the full-text index of the history."""
+        chat = self.chat_history[self.chat_id]
+        try:
+            self.history_index.add(
+                self.chat_id, chat["created_at"], len(chat["turns"]) - 1, role, part
+            )
+        except Exception as e:
+            self.output_manager.debug(f"Error indexing the chat history: {e}")
 
     def add_text_part(self, role, text, save=True):
         """Add a new user message to the chat history."""
         part = {"text": text}
-        proto_part = Part(text=text)
+        proto_part = glm.Part(text=text)
         self.add_part(part, proto_part, role, save)
 
     def add_function_call(self, role, function_name, function_args, save=True):
         """Add a new function call to the chat history."""
         part = {"function_call": {"name": function_name, "args": function_args}}
-        if function_args:
-            proto_part = Part(function_call=FunctionCall(name=function_name, args=function_args))
-        else:
-            proto_part = Part(function_call=FunctionCall(name=function_name))
+        proto_part = self.create_function_call_part(function_name, function_args)
         self.add_part(part, proto_part, role, save)
 
     def add_function_response(self, role, function_name, function_response, save=True):
         """Add a new function response to the chat history."""
         part = {"function_response": {"name": function_name, "response": function_response}}
-        proto_struct_response = Struct()
-        proto_struct_response.update({"response": function_response})
-        proto_part = Part(
-            function_response=FunctionResponse(name=function_name, response=proto_struct_response)
-        )
+        proto_part = self.create_function_response_part(function_name, function_response)
         self.add_part(part, proto_part, role, save)
 
     def add_file(self, file, save=True):
         """Add a new file to the chat history."""
-        proto_part = Part(file_data=FileData(mime_type=file["mime_type"], file_uri=file["uri"]))
+        proto_part = glm.Part(
+            file_data=glm.FileData(mime_type=file["mime_type"], file_uri=file["uri"])
+        )
         self.add_part(file, proto_part, "user", save)
 
     def load_chat(self, chat_id):
@@ -139,33 +263,183 @@ class ChatManager:
 
         self.chat_id = chat_id
         self.current_chat = []
-        chat_turns_len = len(self.chat_history[chat_id]["turns"])
-        for i in range(chat_turns_len):
-            turn = self.chat_history[chat_id]["turns"][i]
-            role = turn["role"]
+        self.compacted_contents = {}
+        self.file_versions = {}
+        # Rebuild the protos directly: going through add_part would append the turns to the
+        # history (and to the index) a second time
+        for turn in self.chat_history[chat_id]["turns"]:
+            proto_parts = []
             for part in turn["parts"]:
                 if "text" in part:
-                    self.add_text_part(role, part["text"], save=False)
+                    proto_parts.append(glm.Part(text=part["text"]))
                 elif "function_call" in part:
-                    self.add_function_call(
-                        role,
-                        part["function_call"]["name"],
-                        part["function_call"]["args"],
-                        save=False,
+                    proto_parts.append(
+                        self.create_function_call_part(
+                            part["function_call"]["name"], part["function_call"]["args"]
+                        )
                     )
                 elif "function_response" in part:
-                    self.add_function_response(
-                        role,
-                        part["function_response"]["name"],
-                        part["function_response"]["response"],
-                        save=False,
+                    proto_parts.append(
+                        self.create_function_response_part(
+                            part["function_response"]["name"],
+                            self.get_response(part["function_response"]),
+                        )
                     )
                 elif "file_data" in part:
                     expiry_time = datetime.fromisoformat(part["file_data"]["expiry_time"])
                     if datetime.now() < expiry_time:
-                        self.add_file(part["file_data"], save=False)
+                        proto_parts.append(
+                            glm.Part(
+                                file_data=glm.FileData(
+                                    mime_type=part["file_data"]["mime_type"],
+                                    file_uri=part["file_data"]["uri"],
+                                )
+                            )
+                        )
                     else:
                         file_path = part['file_data']['original_path']
                         self.output_manager.warning(
                             f"File {file_path} has expired and will not be loaded."
                         )
+            if not proto_parts:
+                continue
+            if self.current_chat and self.current_chat[-1].role == turn["role"]:
+                self.current_chat[-1].parts.extend(proto_parts)
+            else:
+                self.current_chat.append(glm.Content(parts=proto_parts, role=turn["role"]))
+
+    def get_file_delta(self, file_path, content):
+        """
+        Return the unified diff of a file against the version already sent in the chat, or
+        None if the model cannot see that version (never sent, or compacted since).
+        """
+        version = self.file_versions.get(file_path)
+        if version is None:
+            return None
+        base = version["base"]
+        if not any(content is base for content in self.get_model_chat()):
+            return None
+        diff = "".join(
+            difflib.unified_diff(
+                version["content"].splitlines(keepends=True),
+                content.splitlines(keepends=True),
+                fromfile=file_path,
+                tofile=file_path,
+            )
+        )
+        if not diff:
+            return f"The file {file_path} has not changed since it was last loaded in the chat."
+        if not diff.endswith("\n"):
+            diff += "\n"
+        return (
+            f"---Changes in file {file_path} since it was last loaded in the chat---\n"
+            f"{diff}---End of changes---"
+        )
+
+    def set_file_version(self, file_path, content, is_delta=False):
+        """
+        Record the version of a file just sent in the last function response.
+
+        Args:
+            file_path (str): The path of the file.
+            content (str): The content of the file.
+            is_delta (bool): Whether it was sent as a diff, which keeps the previous base.
+        """
+        base = self.file_versions[file_path]["base"] if is_delta else self.current_chat[-1]
+        self.file_versions[file_path] = {"content": content, "base": base}
+
+    def get_model_chat(self):
+        """
+        Return the contents to send to the model, with old turns compacted.
+
+        Turns older than COMPACTION_WINDOW_TURNS have their long texts, function call
+        arguments and function responses replaced by short stubs. Large function responses
+        that the model already consumed (followed by COMPACTION_CONSUMED_AFTER_TURNS turns)
+        are stubbed even inside the window. The originals are kept in current_chat and in
+        the history file, only the request is compacted, so the request size stays roughly
+        flat no matter how long the session runs.
+        """
+        config = self.config_manager.config
+        if not config["COMPACTION_ENABLED"]:
+            return self.current_chat
+
+        chat_len = len(self.current_chat)
+        window_start = chat_len - config["COMPACTION_WINDOW_TURNS"]
+        consumed_end = chat_len - config["COMPACTION_CONSUMED_AFTER_TURNS"]
+        model_chat = []
+        for index, content in enumerate(self.current_chat):
+            if index >= window_start and index >= consumed_end:
+                model_chat.append(content)
+                continue
+            # The compacted copy is reused so the request prefix stays stable across turns,
+            # the part count invalidates it when parts are merged into the last Content
+            key = (id(content), len(content.parts), index < window_start)
+            original, compacted = self.compacted_contents.get(key, (None, None))
+            if original is not content:
+                compacted = self.compact_content(content, is_old=index < window_start)
+                self.compacted_contents[key] = (content, compacted)
+            model_chat.append(compacted or content)
+        return model_chat
+
+    def compact_content(self, content, is_old):
+        """
+        Return a compacted copy of a Content, or None if none of its parts are compacted.
+
+        Args:
+            content (Content): The content to compact.
+            is_old (bool): Whether the turn is outside the compaction window, in which case
+                texts and function call arguments are compacted too.
+        """
+        config = self.config_manager.config
+        max_response_size = config["COMPACTION_MAX_RESPONSE_CHARS"]
+        stub_size = config["COMPACTION_STUB_CHARS"]
+        parts = []
+        changed = False
+        for part in content.parts:
+            part_size = type(part).pb(part).ByteSize()
+            new_part = part
+            if "function_response" in part and (
+                part_size > max_response_size or (is_old and part_size > stub_size)
+            ):
+                name = part.function_response.name
+                response = type(part.function_response).to_dict(part.function_response)
+                preview = json.dumps(response.get("response"), ensure_ascii=False)[:stub_size]
+                stub = (
+                    f"[Compacted result of {name}: {part_size} bytes. It was already used; "
+                    f"call {name} again if you need the full result.]\n{preview}..."
+                )
+                new_part = self.create_function_response_part(name, stub)
+            elif is_old and "text" in part and len(part.text) > stub_size:
+                new_part = glm.Part(text=f"{part.text[:stub_size]}... [compacted]")
+            elif is_old and "function_call" in part and part_size > stub_size:
+                args = type(part.function_call).to_dict(part.function_call).get("args") or {}
+                args = {
+                    key: (
+                        f"{value[:stub_size]}... [compacted]"
+                        if isinstance(value, str) and len(value) > stub_size
+                        else value
+                    )
+                    for key, value in args.items()
+                }
+                new_part = self.create_function_call_part(part.function_call.name, args)
+            changed = changed or new_part is not part
+            parts.append(new_part)
+        if not changed:
+            return None
+        return glm.Content(parts=parts, role=content.role)
+
+    def create_function_call_part(self, function_name, function_args):
+        """Create the proto Part of a function call."""
+        if function_args:
+            return glm.Part(function_call=glm.FunctionCall(name=function_name, args=function_args))
+        return glm.Part(function_call=glm.FunctionCall(name=function_name))
+
+    def create_function_response_part(self, function_name, function_response):
+        """Create the proto Part of a function response."""
+        proto_struct_response = struct_pb2.Struct()
+        proto_struct_response.update({"response": function_response})
+        return glm.Part(
+            function_response=glm.FunctionResponse(
+                name=function_name, response=proto_struct_response
+            )
+        )
@@ -3,6 +3,7 @@ This module manages the configuration settings for the GeminiSH application.
 """
 
 import os
+import sys
 import json
 import platform
 
@@ -18,6 +19,7 @@ class ConfigManager:
 
     DEFAULT_DIR = ".geminiSH"
     CONFIG_FILE = "config.json"
+    SYSTEM_INFORMATION_FILE = "system_information.json"
 
     def __init__(self):
         self.default_directory = self.get_directory()
@@ -27,6 +29,7 @@ class ConfigManager:
         self.agent_directory = self.get_agent_directory()
         self.directory = self.default_directory
         self.is_agent = False
+        self.system_information = None
 
         if self.default_directory != self.agent_directory:
             self.config_agent = self.load_config(
@@ -58,7 +61,40 @@ class ConfigManager:
         return os.path.join(os.getcwd(), self.config.get("AGENT_DIR", self.DEFAULT_DIR))
 
     def get_system_information(self):
-        """Return the system information."""
+        """
+        Return the system information.
+
+        Some of the values (like platform.processor) spawn subprocesses on Linux, so the
+        information is cached in memory and in a snapshot file that is only refreshed when
+        the cheap facts it depends on (uname, Python version and executable) change.
+        """
+        if self.system_information is not None:
+            return self.system_information
+
+        fingerprint = list(os.uname()) + [sys.version, sys.executable]
+        snapshot_file = os.path.join(self.default_directory, self.SYSTEM_INFORMATION_FILE)
+        try:
+            snapshot = self.load_config(snapshot_file)
+        except ValueError:
+            snapshot = None
+        if snapshot and snapshot.get("fingerprint") == fingerprint:
+            self.system_information = snapshot["system_information"]
+            return self.system_information
+
+        self.system_information = self._collect_system_information()
+        try:
+            with open(snapshot_file, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"fingerprint": fingerprint, "system_information": self.system_information},
+                    f,
+                    indent=4,
+                )
+        except OSError:
+            pass
+        return self.system_information
+
+    def _collect_system_information(self):
+        """Collect the system information from the platform module."""
         system_data = {
             "system_name": os.uname().sysname,
             "system_version": os.uname().version,
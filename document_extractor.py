@@ -0,0 +1,253 @@
+"""
+This module extracts the text of documents locally for the GeminiSH application.
+Office documents (docx, pptx, xlsx), OpenDocument files (odt, ods, odp) and EPUB books are
+zip archives of XML or HTML, read with the standard library; PDFs are read with pypdf when
+it is installed. The text is cached by the SHA-256 of the document, so a document is only
+extracted once and does not have to be uploaded: uploads are left for real media files.
+"""
+
+import os
+import re
+import zipfile
+import hashlib
+import threading
+from xml.etree import ElementTree
+from config_manager import ConfigManager
+from html_extractor import HtmlExtractor
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+
+def get_local_name(tag):
+    """Return the name of an XML tag without its namespace."""
+    return tag.rsplit("}", 1)[-1]
+
+
+class DocumentExtractor:
+    """
+    Extracts and caches the text of documents.
+    This class is designed as a singleton so function modules can share the same cache.
+
+    Attributes:
+        CACHE_DIR (str): The name of the text cache directory inside the config directory.
+        directory (str): The absolute path of the text cache directory.
+    """
+
+    CACHE_DIR = "documents"
+    EXTENSIONS = {".docx", ".pptx", ".xlsx", ".odt", ".ods", ".odp", ".epub", ".pdf"}
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, config_manager=None, output_manager=None):
+        if not hasattr(self, "initialized"):
+            # Built from the configuration when a function module is loaded first
+            self.config_manager = config_manager or ConfigManager()
+            self.output_manager = output_manager
+            self.directory = os.path.join(self.config_manager.directory, self.CACHE_DIR)
+            # (path, mtime, size) -> SHA-256 of the document, to avoid hashing it again
+            self.hashes = {}
+            self._lock = threading.Lock()
+            self.initialized = True
+
+    def can_extract(self, file_path):
+        """Check if the text of a file can be extracted locally."""
+        if not self.config_manager.config["DOCUMENT_EXTRACTION_ENABLED"]:
+            return False
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension == ".pdf":
+            return pypdf is not None
+        return extension in self.EXTENSIONS
+
+    def get_hash(self, file_path):
+        """Return the SHA-256 of a file, remembered while the file does not change."""
+        stat = os.stat(file_path)
+        key = (os.path.realpath(file_path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key in self.hashes:
+                return self.hashes[key]
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for data in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(data)
+        with self._lock:
+            self.hashes[key] = digest.hexdigest()
+        return self.hashes[key]
+
+    def extract(self, file_path):
+        """
+        Return the text of a document, from the cache if it was already extracted.
+
+        Returns:
+            str: The text, or None if the document has no text or could not be read (e.g. a
+                 scanned PDF), in which case it should be uploaded instead.
+        """
+        try:
+            cache_file = os.path.join(self.directory, f"{self.get_hash(file_path)}.txt")
+            if os.path.exists(cache_file):
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    return f.read() or None
+            text = self.extract_text(file_path).strip()
+        except Exception as e:
+            if self.output_manager:
+                self.output_manager.debug(f"Error extracting the text of {file_path}: {e}")
+            return None
+        if not text:
+            # Not cached, a document without text (e.g. a scanned PDF) is uploaded instead
+            return None
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_file = f"{cache_file}.tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            if self.output_manager:
+                self.output_manager.debug(f"Error caching the text of {file_path}: {e}")
+        return text
+
+    @staticmethod
+    def join_parts(title, parts):
+        """
+        Join the (number, text) parts of a document under a header per part, e.g. the pages.
+        An empty text is returned when no part has text, so headers alone are not a text.
+        """
+        if not any(text.strip() for _, text in parts):
+            return ""
+        return "\n\n".join(f"--- {title} {number} ---\n{text}" for number, text in parts)
+
+    def extract_text(self, file_path):
+        """Extract the text of a document according to its extension."""
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension == ".pdf":
+            reader = pypdf.PdfReader(file_path)
+            pages = [page.extract_text() or "" for page in reader.pages]
+            return self.join_parts("Page", list(enumerate(pages, 1)))
+        with zipfile.ZipFile(file_path) as archive:
+            if extension == ".docx":
+                return self.get_paragraphs(archive.read("word/document.xml"), {"p"}, "t")
+            if extension == ".pptx":
+                return self.get_numbered_parts(archive, r"ppt/slides/slide(\d+)\.xml", "Slide")
+            if extension == ".xlsx":
+                return self.get_spreadsheet_text(archive)
+            if extension == ".epub":
+                return self.get_epub_text(archive)
+            # OpenDocument: paragraphs and headings, and the rows of the tables
+            return self.get_paragraphs(archive.read("content.xml"), {"p", "h"})
+
+    @staticmethod
+    def get_paragraphs(xml_data, paragraph_tags, text_tag=None):
+        """
+        Return the text of the paragraphs of an XML document, one per line.
+
+        Args:
+            xml_data (bytes): The XML document.
+            paragraph_tags (set): The local names of the paragraph elements. Table rows
+                (OpenDocument "table-row") are returned as one line of tab separated cells.
+            text_tag (str, optional): The local name of the elements holding the text; all
+                the text of a paragraph is used if not set.
+        """
+        lines = []
+
+        def get_text(element):
+            if text_tag:
+                return "".join(
+                    node.text or ""
+                    for node in element.iter()
+                    if get_local_name(node.tag) == text_tag
+                )
+            return "".join(element.itertext())
+
+        def walk(element):
+            # A paragraph is not walked into, so the paragraphs of a table row are not
+            # repeated after the row
+            for child in element:
+                tag = get_local_name(child.tag)
+                if tag == "table-row":
+                    cells = [
+                        get_text(cell) for cell in child if get_local_name(cell.tag) == "table-cell"
+                    ]
+                    lines.append("\t".join(cells).rstrip())
+                elif tag in paragraph_tags:
+                    lines.append(get_text(child))
+                else:
+                    walk(child)
+
+        walk(ElementTree.fromstring(xml_data))
+        return "\n".join(lines)
+
+    def get_numbered_parts(self, archive, pattern, title):
+        """Return the text of the numbered parts of an archive, e.g. the slides."""
+        regex = re.compile(pattern)
+        parts = sorted(
+            (int(match.group(1)), name)
+            for name in archive.namelist()
+            for match in [regex.fullmatch(name)]
+            if match
+        )
+        return self.join_parts(
+            title,
+            [
+                (number, self.get_paragraphs(archive.read(name), {"p"}, "t"))
+                for number, name in parts
+            ],
+        )
+
+    def get_spreadsheet_text(self, archive):
+        """Return the rows of every sheet of an xlsx file, with tab separated cells."""
+        shared_strings = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            root = ElementTree.fromstring(archive.read("xl/sharedStrings.xml"))
+            for item in root:
+                shared_strings.append(
+                    "".join(
+                        node.text or "" for node in item.iter() if get_local_name(node.tag) == "t"
+                    )
+                )
+        regex = re.compile(r"xl/worksheets/sheet(\d+)\.xml")
+        sheets = sorted(
+            (int(match.group(1)), name)
+            for name in archive.namelist()
+            for match in [regex.fullmatch(name)]
+            if match
+        )
+        texts = []
+        for number, name in sheets:
+            rows = []
+            for row in ElementTree.fromstring(archive.read(name)).iter():
+                if get_local_name(row.tag) != "row":
+                    continue
+                cells = []
+                for cell in row:
+                    value = next(
+                        (node for node in cell if get_local_name(node.tag) == "v"), None
+                    )
+                    if cell.get("t") == "s" and value is not None:
+                        cells.append(shared_strings[int(value.text)])
+                    elif cell.get("t") == "inlineStr":
+                        cells.append("".join(cell.itertext()))
+                    else:
+                        cells.append(value.text if value is not None and value.text else "")
+                rows.append("\t".join(cells).rstrip())
+            texts.append((number, "\n".join(rows)))
+        return self.join_parts("Sheet", texts)
+
+    @staticmethod
+    def get_epub_text(archive):
+        """Return the text of the chapters of an EPUB book, in archive order."""
+        texts = []
+        for name in archive.namelist():
+            if name.lower().endswith((".xhtml", ".html", ".htm")):
+                extractor = HtmlExtractor()
+                extractor.feed(archive.read(name).decode("utf-8", errors="replace"))
+                extractor.close()
+                texts.append(extractor.get_text())
+        return "\n\n".join(text for text in texts if text.strip())
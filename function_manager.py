@@ -4,13 +4,22 @@ It handles loading, executing, and managing functions, including checking depend
 """
 
 import os
+import atexit
 import importlib
+import importlib.util
 import inspect
 import subprocess
+import threading
 import sys
 import re
 
-from google.ai.generativelanguage import FunctionDeclaration, Schema, Type
+from lazy_module import LazyModule
+from telemetry_manager import TelemetryManager
+from session_manager import get_current_session
+from function_worker_pool import FunctionWorkerPool
+from function_watcher import FunctionWatcher
+
+glm = LazyModule("google.ai.generativelanguage")
 
 
 class FunctionManager:
@@ -18,52 +27,80 @@ class FunctionManager:
     This module manages the functions for the GeminiSH application.
     It handles loading, executing, and managing functions, including checking dependencies.
     """
+
+    # Import name -> name of the distribution to install, when they differ
+    PACKAGE_NAMES = {
+        "PIL": "pillow",
+        "google": "google-generativeai",
+        "yaml": "pyyaml",
+        "bs4": "beautifulsoup4",
+        "cv2": "opencv-python",
+        "sklearn": "scikit-learn",
+    }
+
     def __init__(self, config_manager, chat_manager, output_manager, input_manager):
         self.config_manager = config_manager
-        self.chat_manager = chat_manager
+        self._chat_manager = chat_manager
         self.output_manager = output_manager
         self.input_manager = input_manager
-        self.functions = self.load_functions()
+        self.telemetry_manager = TelemetryManager()
+        # Function name -> {"module_path", "timeout"} of the functions run out of process
+        self.isolated_functions = {}
+        self.isolated_modules = {}
+        self.worker_pool = None
+        # Module path -> names of its functions and function name -> its module path
+        self.module_functions = {}
+        self.function_modules = {}
+        # Function name -> its FunctionDeclaration, built on demand
+        self.declarations = {}
+        self.pending_reloads = set()
+        self._reload_lock = threading.Lock()
+        self.functions = {}
+        self.watcher = None
+
+    def load_all_functions(self):
+        """
+        Load the default and agent functions, start the worker pool and the file watcher.
+        Called by the ModelManager initialization, usually on a background thread; when a
+        failed initialization is retried, the pool and the watcher of the failed attempt are
+        stopped first.
+        """
+        self.stop_worker_pool()
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.load_functions()
         if self.config_manager.is_agent:
-            agent_functions = self.load_functions(True)
-            self.functions.update(agent_functions)
+            self.load_functions(True)
+        self.start_worker_pool()
+        if self.config_manager.config["FUNCTION_HOT_RELOAD"]:
+            self.watcher = FunctionWatcher(
+                self.get_functions_directories(),
+                self.queue_reload,
+                self.config_manager.config["FUNCTION_RELOAD_POLL_INTERVAL"],
+            )
+            self.watcher.start()
+
+    @property
+    def chat_manager(self):
+        """The chat manager of the active session, or the one of the terminal REPL."""
+        session = get_current_session()
+        return session.chat_manager if session else self._chat_manager
 
     def load_functions(self, is_agent=False):
         """Load functions from the functions folder and check dependencies."""
         functions = {}
-        if is_agent:
-            functions_directory = os.path.join(
-                self.config_manager.get_agent_directory(), "functions"
-            )
-        else:
-            functions_directory = os.path.join(self.config_manager.get_directory(), "functions")
+        functions_directory = self.get_functions_directory(is_agent)
         if not os.path.exists(functions_directory):
             os.makedirs(functions_directory)
         else:
             for filename in os.listdir(functions_directory):
                 if filename.endswith(".py"):
                     try:
-                        module_name = filename[:-3]
                         module_path = os.path.join(functions_directory, filename)
-                        # Check and install missing dependencies
-                        try:
-                            self._check_and_install_dependencies(module_path)
-                        except Exception as e:
-                            self.output_manager.debug(
-                                f"Error checking and installing dependencies for '{filename}': {e}"
-                            )
-
-                        spec = importlib.util.spec_from_file_location(module_name, module_path)
-                        module = importlib.util.module_from_spec(spec)
-                        spec.loader.exec_module(module)  # Ensure the module is executed
-                        for func_name, func in module.__dict__.items():
-                            if (
-                                callable(func)
-                                and not func_name.startswith("__")
-                                and not inspect.isclass(func)
-                            ):
-                                functions[func_name] = func
-                                self.output_manager.debug(f"Function loaded: {func_name}")
+                        module_functions = self.load_module(module_path)
+                        self.register_functions(module_path, module_functions)
+                        functions.update(module_functions)
                     except Exception as e:
                         self.output_manager.debug(f"Error loading function from '{filename}': {e}")
 
@@ -76,32 +113,175 @@ class FunctionManager:
 
         return functions
 
+    def load_module(self, module_path):
+        """Import a function module, after checking its dependencies, and return its functions."""
+        filename = os.path.basename(module_path)
+        module_name = filename[:-3]
+        # Check and install missing dependencies
+        try:
+            self._check_and_install_dependencies(module_path)
+        except Exception as e:
+            self.output_manager.debug(
+                f"Error checking and installing dependencies for '{filename}': {e}"
+            )
+
+        spec = importlib.util.spec_from_file_location(module_name, module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)  # Ensure the module is executed
+        isolated = getattr(module, "ISOLATED", False) or (
+            module_name in self.config_manager.config["FUNCTION_ISOLATED"]
+        )
+        self.isolated_modules[module_path] = (
+            {"module_path": module_path, "timeout": getattr(module, "TIMEOUT", None)}
+            if isolated
+            else None
+        )
+        functions = {}
+        for func_name, func in module.__dict__.items():
+            if callable(func) and not func_name.startswith("__") and not inspect.isclass(func):
+                functions[func_name] = func
+                self.output_manager.debug(f"Function loaded: {func_name}")
+        return functions
+
+    def get_functions_directory(self, is_agent=False):
+        """Return the functions directory of the agent or the default one."""
+        if is_agent:
+            return os.path.join(self.config_manager.get_agent_directory(), "functions")
+        return os.path.join(self.config_manager.get_directory(), "functions")
+
+    def get_functions_directories(self):
+        """Return the functions directories that are loaded, default first."""
+        directories = [self.get_functions_directory()]
+        if self.config_manager.is_agent:
+            directories.append(self.get_functions_directory(True))
+        return directories
+
+    def is_agent_module(self, module_path):
+        """Check if a function module belongs to the agent directory."""
+        return self.config_manager.is_agent and os.path.dirname(
+            module_path
+        ) == self.get_functions_directory(True)
+
+    def register_functions(self, module_path, functions):
+        """Make the functions of a module available; agent functions override default ones."""
+        self.module_functions[module_path] = list(functions)
+        for func_name, func in functions.items():
+            owner = self.function_modules.get(func_name)
+            if (
+                owner
+                and owner != module_path
+                and self.is_agent_module(owner)
+                and not self.is_agent_module(module_path)
+            ):
+                continue
+            self.functions[func_name] = func
+            self.function_modules[func_name] = module_path
+            self.declarations.pop(func_name, None)
+            self.isolated_functions.pop(func_name, None)
+            if self.isolated_modules.get(module_path):
+                self.isolated_functions[func_name] = self.isolated_modules[module_path]
+
+    def unregister_functions(self, module_path):
+        """Remove the functions of a module."""
+        for func_name in self.module_functions.pop(module_path, []):
+            if self.function_modules.get(func_name) == module_path:
+                del self.function_modules[func_name]
+                self.functions.pop(func_name, None)
+                self.declarations.pop(func_name, None)
+                self.isolated_functions.pop(func_name, None)
+
+    def queue_reload(self, module_path):
+        """Queue a changed function module; it is reloaded at the next safe point."""
+        with self._reload_lock:
+            self.pending_reloads.add(module_path)
+
+    def apply_pending_reloads(self):
+        """
+        Reload the function modules that changed since the last call.
+        Only the changed modules are imported again and only their declarations rebuilt.
+
+        Returns:
+            bool: Whether the functions changed, i.e. the model tools must be refreshed.
+        """
+        with self._reload_lock:
+            module_paths, self.pending_reloads = self.pending_reloads, set()
+        if not module_paths:
+            return False
+
+        restart_pool = False
+        for module_path in sorted(module_paths):
+            was_isolated = bool(self.isolated_modules.pop(module_path, None))
+            self.unregister_functions(module_path)
+            if os.path.exists(module_path):
+                try:
+                    self.register_functions(module_path, self.load_module(module_path))
+                    self.output_manager.debug(f"Function module reloaded: {module_path}")
+                except Exception as e:
+                    self.output_manager.warning(
+                        f"Error reloading function from '{os.path.basename(module_path)}': {e}"
+                    )
+            is_isolated = bool(self.isolated_modules.get(module_path))
+            restart_pool = restart_pool or was_isolated or is_isolated
+
+        if restart_pool:
+            # The workers imported the previous version of the isolated modules
+            self.stop_worker_pool()
+            self.start_worker_pool()
+        return True
+
     def _check_and_install_dependencies(self, module_path):
         """Check and install necessary dependencies for a module."""
         with open(module_path, "r", encoding="utf-8") as file:
             content = file.read()
 
-        # Find all import statements
+        # Find all import statements, including the lazy ones
         imports = re.findall(r"^\s*(?:import|from)\s+([a-zA-Z0-9_\.]+)", content, re.MULTILINE)
+        imports += re.findall(r"LazyModule\(\s*[\"']([a-zA-Z0-9_\.]+)[\"']", content)
 
-        for package in imports:
-            try:
-                importlib.import_module(package.split(".")[0])
-            except ImportError:
+        for module_name in dict.fromkeys(name.split(".")[0] for name in imports):
+            # find_spec locates the package without executing it, so checking the
+            # dependencies does not import heavy modules that may never be used
+            if importlib.util.find_spec(module_name) is None:
+                package = self.PACKAGE_NAMES.get(module_name, module_name)
                 self.output_manager.debug(f"Installing missing package: {package}")
                 subprocess.check_call(
-                    [sys.executable, "-m", "pip", "install", package.split(".")[0]],
+                    [sys.executable, "-m", "pip", "install", package],
                     stdout=subprocess.DEVNULL,
                     stderr=subprocess.DEVNULL,
                 )
 
+    def start_worker_pool(self):
+        """Start the worker processes of the isolated functions, if there are any."""
+        if not self.isolated_functions:
+            return
+        config = self.config_manager.config
+        module_paths = {function["module_path"] for function in self.isolated_functions.values()}
+        self.worker_pool = FunctionWorkerPool(
+            self.output_manager,
+            sorted(module_paths),
+            size=config["FUNCTION_WORKERS"],
+            memory_limit_mb=config["FUNCTION_MEMORY_LIMIT_MB"],
+        )
+        self.worker_pool.start()
+        atexit.register(self.worker_pool.shutdown)
+
+    def stop_worker_pool(self):
+        """Stop the worker processes of the isolated functions, if they are running."""
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+            atexit.unregister(self.worker_pool.shutdown)
+            self.worker_pool = None
+
     def set_model_manager(self, model_manager):
         """Set the model_manager after initialization."""
         self.model_manager = model_manager
 
     def get_as_declarations(self):
-        """Convert functions into function declarations."""
-        return [self._create_function_declaration(func) for func in self.functions.values()]
+        """Convert functions into function declarations, reusing the ones already built."""
+        for func_name, func in self.functions.items():
+            if func_name not in self.declarations:
+                self.declarations[func_name] = self._create_function_declaration(func)
+        return [self.declarations[func_name] for func_name in self.functions]
 
     def _create_function_declaration(self, func):
         """Create a function declaration from a Python function."""
@@ -117,11 +297,11 @@ class FunctionManager:
             if param.default == inspect._empty:
                 required.append(param_name)
 
-        return FunctionDeclaration(
+        return glm.FunctionDeclaration(
             name=func_name,
             description=func_doc,
             parameters=(
-                Schema(type_=Type.OBJECT, properties=properties, required=required)
+                glm.Schema(type_=glm.Type.OBJECT, properties=properties, required=required)
                 if params_items
                 else None
             ),
@@ -131,28 +311,41 @@ class FunctionManager:
         """Convert a Python type to a corresponding proto type."""
         actual_type = python_type[1] if isinstance(python_type, tuple) else python_type
         if actual_type == str:
-            return Schema(type_=Type.STRING)
+            return glm.Schema(type_=glm.Type.STRING)
         elif actual_type == int:
-            return Schema(type_=Type.INTEGER)
+            return glm.Schema(type_=glm.Type.INTEGER)
         elif actual_type == float:
-            return Schema(type_=Type.NUMBER)
+            return glm.Schema(type_=glm.Type.NUMBER)
         elif actual_type == bool:
-            return Schema(type_=Type.BOOLEAN)
+            return glm.Schema(type_=glm.Type.BOOLEAN)
         elif isinstance(actual_type, list):
             item_type = self._convert_python_type_to_proto_type(actual_type[0])
-            return Schema(type=Type.ARRAY, items=item_type)
+            return glm.Schema(type=glm.Type.ARRAY, items=item_type)
         elif isinstance(actual_type, dict):
-            return Schema(type_=Type.OBJECT)
+            return glm.Schema(type_=glm.Type.OBJECT)
         else:
-            return Schema(type_=Type.STRING)
+            return glm.Schema(type_=glm.Type.STRING)
 
     def execute_function(self, function_name, args):
         """Execute a function with the provided arguments."""
         if function_name in self.functions:
-            try:
-                return self.functions[function_name](**args)
-            except Exception as e:
-                return f"[error]Error executing function: {e}[/error]"
+            isolated = self.worker_pool and self.isolated_functions.get(function_name)
+            with self.telemetry_manager.span(
+                function_name, "function", isolated=bool(isolated)
+            ) as span:
+                try:
+                    if isolated:
+                        response = self.worker_pool.call(
+                            function_name,
+                            args,
+                            isolated["timeout"] or self.config_manager.config["FUNCTION_TIMEOUT"],
+                        )
+                    else:
+                        response = self.functions[function_name](**args)
+                except Exception as e:
+                    response = f"[error]Error executing function: {e}[/error]"
+                span["bytes_in"] = len(str(response))
+                return response
         else:
             return f"[error]Function not found: {function_name}[/error]"
 
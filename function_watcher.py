@@ -0,0 +1,132 @@
+"""
+This module watches the functions directories of the GeminiSH application.
+When a function module is created, modified or deleted, its path is passed to a callback
+so the FunctionManager can reload only that module. On Linux the directories are watched
+with inotify (through ctypes, without dependencies); elsewhere their modification times
+are polled.
+"""
+
+import os
+import sys
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+
+# inotify event masks, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class FunctionWatcher:
+    """
+    Watches the function modules of some directories in a background thread.
+
+    Attributes:
+        directories (list): The watched directories.
+        callback (callable): Called with the path of every changed module.
+        poll_interval (float): Seconds between scans when inotify is not available.
+    """
+
+    def __init__(self, directories, callback, poll_interval=1.0):
+        self.directories = [directory for directory in directories if os.path.isdir(directory)]
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.thread = None
+        # inotify watch descriptor -> watched directory
+        self._watches = {}
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """Start watching; uses inotify when available and polling otherwise."""
+        target, args = self._watch_polling, ()
+        if sys.platform.startswith("linux"):
+            inotify_fd = self._init_inotify()
+            if inotify_fd is not None:
+                target, args = self._watch_inotify, (inotify_fd,)
+        self.thread = threading.Thread(
+            target=target, args=args, name="FunctionWatcher", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        """Stop watching; the thread ends within poll_interval seconds."""
+        self._stop_event.set()
+
+    @staticmethod
+    def is_module(filename):
+        """Check if a file name is a function module (and not an editor temporary file)."""
+        return filename.endswith(".py") and not filename.startswith((".", "#"))
+
+    def _init_inotify(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            inotify_fd = libc.inotify_init1(IN_CLOEXEC)
+            if inotify_fd < 0:
+                return None
+            for directory in self.directories:
+                watch = libc.inotify_add_watch(
+                    inotify_fd, os.fsencode(directory), ctypes.c_uint32(WATCH_MASK)
+                )
+                if watch < 0:
+                    os.close(inotify_fd)
+                    return None
+                self._watches[watch] = directory
+            return inotify_fd
+        except (OSError, AttributeError):
+            return None
+
+    def _watch_inotify(self, inotify_fd):
+        try:
+            self._read_inotify(inotify_fd)
+        finally:
+            os.close(inotify_fd)
+
+    def _read_inotify(self, inotify_fd):
+        while not self._stop_event.is_set():
+            try:
+                # Waits with a timeout instead of blocking in read, so stop() is noticed
+                if not select.select([inotify_fd], [], [], self.poll_interval)[0]:
+                    continue
+                data = os.read(inotify_fd, 64 * 1024)
+            except OSError:
+                return
+            offset = 0
+            changed = set()
+            while offset + EVENT_HEADER.size <= len(data):
+                watch, _, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                filename = os.fsdecode(data[offset:offset + name_length].rstrip(b"\0"))
+                offset += name_length
+                if watch in self._watches and self.is_module(filename):
+                    changed.add(os.path.join(self._watches[watch], filename))
+            for module_path in changed:
+                self.callback(module_path)
+
+    def _scan(self):
+        modules = {}
+        for directory in self.directories:
+            try:
+                for entry in os.scandir(directory):
+                    if entry.is_file() and self.is_module(entry.name):
+                        stat = entry.stat()
+                        modules[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                continue
+        return modules
+
+    def _watch_polling(self):
+        modules = self._scan()
+        while not self._stop_event.wait(self.poll_interval):
+            current = self._scan()
+            for module_path in set(modules) | set(current):
+                if modules.get(module_path) != current.get(module_path):
+                    self.callback(module_path)
+            modules = current
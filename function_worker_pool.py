@@ -0,0 +1,224 @@
+"""
+This module runs isolated functions of the GeminiSH application out of process.
+Function modules that define `ISOLATED = True` (or are listed in FUNCTION_ISOLATED) are
+executed by a pool of prewarmed worker processes, which import the function modules once
+at startup. Every call has a timeout (the module TIMEOUT or FUNCTION_TIMEOUT) and the
+workers run under a memory limit, so a slow, crashing or CPU-heavy function neither blocks
+the REPL nor corrupts the state of the main interpreter. A worker that times out or dies
+is replaced by a new one.
+"""
+
+import io
+import os
+import sys
+import queue
+import signal
+import threading
+import importlib.util
+import inspect
+import multiprocessing
+from contextlib import redirect_stderr
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+ROOT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def worker_main(connection, module_paths, memory_limit_mb):
+    """
+    Entry point of a worker process: import the function modules and serve calls.
+
+    Every request received on the connection is a (function_name, args) tuple, answered
+    with a ("result", response) tuple. None stops the worker.
+    """
+    # Ctrl+C is handled by the main process, which replaces the worker if needed
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sys.path.insert(0, ROOT_DIRECTORY)
+    if resource and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+
+    # The singletons the function modules use, configured like in the main process
+    from config_manager import ConfigManager
+    from telemetry_manager import TelemetryManager
+    from output_manager import OutputManager
+    from input_manager import InputManager
+    from cache_manager import CacheManager
+    from document_extractor import DocumentExtractor
+
+    config_manager = ConfigManager()
+    TelemetryManager(config_manager)
+    output_manager = OutputManager(config_manager)
+    with redirect_stderr(io.StringIO()):
+        # Workers have no terminal, only the prompt_toolkit warning about it is silenced
+        InputManager(output_manager)
+    CacheManager(config_manager, output_manager)
+    DocumentExtractor(config_manager, output_manager)
+
+    functions = {}
+    for module_path in module_paths:
+        try:
+            module_name = os.path.splitext(os.path.basename(module_path))[0]
+            spec = importlib.util.spec_from_file_location(module_name, module_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            for func_name, func in module.__dict__.items():
+                if callable(func) and not func_name.startswith("__") and not inspect.isclass(func):
+                    functions[func_name] = func
+        except Exception as e:
+            output_manager.debug(f"Worker error loading '{module_path}': {e}")
+    connection.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            request = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if request is None:
+            break
+        function_name, args = request
+        try:
+            response = functions[function_name](**args)
+        except KeyError:
+            response = f"[error]Function not found in the worker: {function_name}[/error]"
+        except MemoryError:
+            response = f"[error]Function ran out of memory ({memory_limit_mb} MB limit)[/error]"
+        except Exception as e:
+            response = f"[error]Error executing function: {e}[/error]"
+        try:
+            connection.send(("result", response))
+        except Exception:
+            # The response could not be pickled, send its text instead
+            connection.send(("result", str(response)))
+
+
+class FunctionWorker:
+    """A worker process and the connection used to send it calls."""
+
+    STARTUP_TIMEOUT = 60
+
+    def __init__(self, context, module_paths, memory_limit_mb):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=worker_main,
+            args=(child_connection, module_paths, memory_limit_mb),
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        self.ready = False
+
+    def wait_ready(self):
+        """Wait until the worker imported the function modules."""
+        if not self.ready:
+            if not self.connection.poll(self.STARTUP_TIMEOUT):
+                raise TimeoutError("The function worker did not start")
+            self.connection.recv()
+            self.ready = True
+
+    def stop(self, timeout=1):
+        """Stop the worker, killing it if it does not exit in time."""
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class FunctionWorkerPool:
+    """
+    Pool of worker processes that execute the isolated functions.
+
+    Attributes:
+        module_paths (list): The function modules imported by every worker.
+        size (int): The number of workers, i.e. of isolated calls running at the same time.
+        memory_limit_mb (int): The address space limit of every worker, 0 for no limit.
+    """
+
+    def __init__(self, output_manager, module_paths, size=2, memory_limit_mb=0):
+        self.output_manager = output_manager
+        self.module_paths = list(module_paths)
+        self.size = max(1, size)
+        self.memory_limit_mb = memory_limit_mb
+        # spawn: forking a process that already runs threads and holds sockets is unsafe
+        self.context = multiprocessing.get_context("spawn")
+        self.idle_workers = queue.Queue()
+        self._lock = threading.Lock()
+        self.workers = []
+
+    def start(self):
+        """Start the workers; they import the function modules in the background."""
+        for _ in range(self.size):
+            self.idle_workers.put(self._create_worker())
+
+    def _create_worker(self):
+        worker = FunctionWorker(self.context, self.module_paths, self.memory_limit_mb)
+        with self._lock:
+            self.workers.append(worker)
+        return worker
+
+    def _replace_worker(self, worker):
+        with self._lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+        worker.stop(timeout=0)
+        self.idle_workers.put(self._create_worker())
+
+    def call(self, function_name, args, timeout):
+        """
+        Execute a function in a worker.
+
+        Args:
+            function_name (str): The name of the function.
+            args (dict): The keyword arguments of the function.
+            timeout (float): Seconds to wait for an idle worker, then for the result before
+                killing the worker.
+
+        Returns:
+            The response of the function, or an error message.
+        """
+        try:
+            worker = self.idle_workers.get(timeout=timeout)
+        except queue.Empty:
+            return (
+                f"[error]No worker was available to execute {function_name} "
+                f"after {timeout} seconds[/error]"
+            )
+        try:
+            worker.wait_ready()
+            worker.connection.send((function_name, args))
+            if not worker.connection.poll(timeout):
+                self._replace_worker(worker)
+                return f"[error]Function {function_name} timed out after {timeout} seconds[/error]"
+            _, response = worker.connection.recv()
+        except (EOFError, OSError, TimeoutError) as e:
+            worker.process.join(1)
+            exit_code = worker.process.exitcode
+            self._replace_worker(worker)
+            return (
+                f"[error]The worker executing {function_name} failed "
+                f"(exit code {exit_code}): {str(e) or 'the worker exited'}[/error]"
+            )
+        except BaseException:
+            # Interrupted while the worker is busy, its state is unknown
+            self._replace_worker(worker)
+            raise
+        self.idle_workers.put(worker)
+        return response
+
+    def shutdown(self):
+        """Stop every worker."""
+        with self._lock:
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.stop()
@@ -10,8 +10,13 @@ from function_manager import FunctionManager
 from output_manager import OutputManager
 from input_manager import InputManager
 from config_manager import ConfigManager
+from cache_manager import CacheManager
+from path_index import PathIndex
+from document_extractor import DocumentExtractor
+from telemetry_manager import TelemetryManager
 from state_manager import StateManager
 from model_manager import ModelManager
+from session_manager import SessionManager, get_current_session, set_terminal_chat_manager
 
 
 class GeminiAgent:
@@ -19,16 +24,24 @@ class GeminiAgent:
     This module defines the GeminiAgent class, which serves as the main interface for the
     GeminiSH application. It initializes the necessary managers and handles the main user
     interaction loop, processing user inputs and managing the communication with the Google
-    Gemini model.
+    Gemini model. The same agent can also serve concurrent sessions, see SessionManager.
     """
+
+    COMMANDS = {"/stats", "/search"}
+
     def __init__(self):
         self.config_manager = ConfigManager()
+        self.telemetry_manager = TelemetryManager(self.config_manager)
         self.output_manager = OutputManager(self.config_manager)
         self.input_manager = InputManager(self.output_manager)
         self.state_manager = StateManager(self.config_manager, self.output_manager)
-        self.chat_manager = ChatManager(
+        self.cache_manager = CacheManager(self.config_manager, self.output_manager)
+        self.path_index = PathIndex(self.config_manager, self.output_manager)
+        self.document_extractor = DocumentExtractor(self.config_manager, self.output_manager)
+        self._chat_manager = ChatManager(
             self.config_manager, self.output_manager, self.input_manager, self.state_manager
         )
+        set_terminal_chat_manager(self._chat_manager)
         self.function_manager = FunctionManager(
             self.config_manager, self.chat_manager, self.output_manager, self.input_manager
         )
@@ -41,6 +54,15 @@ class GeminiAgent:
             self.chat_manager,
         )
         self.function_manager.set_model_manager(self.model_manager)
+        # Functions and model are initialized in the background while the prompt comes up
+        self.model_manager.start_initialization(self.config_manager.config["BACKGROUND_INIT"])
+        self.session_manager = SessionManager(self)
+
+    @property
+    def chat_manager(self):
+        """The chat manager of the active session, or the one of the terminal REPL."""
+        session = get_current_session()
+        return session.chat_manager if session else self._chat_manager
 
     def run(self):
         """Run the main user interaction loop."""
@@ -58,6 +80,29 @@ class GeminiAgent:
 
     def process_message(self, user_input):
         """Process the message entered by the user."""
+        # Only the known commands, a message like "/etc/hosts what is this?" is a prompt
+        words = user_input.split(maxsplit=1)
+        if words and words[0].lower() in self.COMMANDS:
+            return self.process_command(user_input)
+
+        self.telemetry_manager.start_turn()
+        try:
+            with self.telemetry_manager.span("turn", "turn", bytes_out=len(user_input)):
+                self.process_turn(user_input)
+        except KeyboardInterrupt:
+            # Ctrl+C during a turn cancels the turn, not the session
+            self.output_manager.warning("Cancelled.")
+        finally:
+            # Group commit: the parts added during the turn are written once
+            self.chat_manager.flush_chat_history()
+
+    def process_turn(self, user_input):
+        """Send the user message to the model, or execute it if it is a function name."""
+        try:
+            self.model_manager.refresh_functions()
+        except Exception as e:
+            self.output_manager.error(f"Gemini could not start: {e}")
+            return
         if (
             len(user_input.split()) == 1
             and user_input.lower() in self.function_manager.functions
@@ -76,6 +121,51 @@ class GeminiAgent:
             self.chat_manager.add_text_part("user", user_input)
             self.model_manager.generate_content()
 
+    def process_command(self, user_input):
+        """
+        Process a built-in REPL command.
+
+        Commands:
+            /stats: Show the performance stats of the last turn and of the session.
+            /stats export <file> [chrome|otel]: Export the recorded spans.
+            /stats reset: Remove the recorded spans.
+            /search <query>: Search the chat history.
+        """
+        parts = user_input.split()
+        command = parts[0].lower()
+        if command == "/stats":
+            if len(parts) == 1:
+                self.output_manager.print(
+                    self.telemetry_manager.get_stats_markdown(), markdown=True
+                )
+            elif parts[1] == "reset":
+                self.telemetry_manager.reset()
+                self.output_manager.print("[green]Stats reset.[/green]")
+            elif parts[1] == "export" and len(parts) >= 3:
+                export_format = parts[3].lower() if len(parts) > 3 else "chrome"
+                if export_format not in self.telemetry_manager.EXPORT_FORMATS:
+                    self.output_manager.error(f"Unknown export format: {export_format}")
+                    return
+                try:
+                    count = self.telemetry_manager.export(parts[2], export_format)
+                except OSError as e:
+                    self.output_manager.error(f"Could not export the stats: {e}")
+                    return
+                self.output_manager.print(f"[green]{count} spans exported to {parts[2]}[/green]")
+            else:
+                self.output_manager.warning(
+                    "Usage: /stats | /stats export <file> [chrome|otel] | /stats reset"
+                )
+        elif command == "/search":
+            if len(parts) == 1:
+                self.output_manager.warning("Usage: /search <query>")
+                return
+            query = user_input.split(maxsplit=1)[1]
+            self.output_manager.print(
+                self.chat_manager.history_index.get_search_markdown(query), markdown=True
+            )
+
     def exit(self):
         """Exit the main loop."""
+        self.chat_manager.flush_chat_history()
         exit()
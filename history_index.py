@@ -0,0 +1,213 @@
+"""
+This module keeps a full-text index of the chat history of the GeminiSH application.
+Every part added to a chat is indexed incrementally in a SQLite FTS5 database next to
+history.json, so past sessions can be listed and searched (ranked hits with snippets)
+without reading and scanning the whole history file.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from config_manager import ConfigManager
+
+
+class HistoryIndex:
+    """
+    Full-text index over the turns of every chat session.
+    This class is designed as a singleton so function modules can query the same index.
+
+    Attributes:
+        INDEX_FILE_NAME (str): The name of the index database inside the config directory.
+        MAX_PART_CHARS (int): The maximum number of characters indexed per part.
+        has_fts (bool): Whether SQLite was built with FTS5; if not, search falls back to LIKE.
+    """
+
+    INDEX_FILE_NAME = "history_index.sqlite"
+    MAX_PART_CHARS = 100000
+    PREVIEW_CHARS = 50
+    SNIPPET_TOKENS = 16
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, config_manager=None, output_manager=None):
+        if not hasattr(self, "initialized"):
+            # Built from the configuration when a function module is loaded first
+            self.config_manager = config_manager or ConfigManager()
+            self.output_manager = output_manager
+            self.index_file = os.path.join(self.config_manager.directory, self.INDEX_FILE_NAME)
+            self._lock = threading.RLock()
+            self.connection = sqlite3.connect(self.index_file, check_same_thread=False)
+            self.has_fts = self.create_tables()
+            self.initialized = True
+
+    def create_tables(self):
+        """Create the index tables, returning whether the FTS5 table could be created."""
+        with self._lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (chat_id TEXT PRIMARY KEY, "
+                "created_at TEXT, preview TEXT, part_count INTEGER NOT NULL DEFAULT 0)"
+            )
+            try:
+                self.connection.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS parts USING fts5("
+                    "chat_id UNINDEXED, turn UNINDEXED, role UNINDEXED, content)"
+                )
+                return True
+            except sqlite3.OperationalError:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS parts "
+                    "(chat_id TEXT, turn INTEGER, role TEXT, content TEXT)"
+                )
+                return False
+
+    def sync(self, chat_history):
+        """
+        Index the parts of the chat history that are not indexed yet.
+        On the first run this indexes the whole history; afterwards only sessions written
+        while the index was not updated (e.g. by an older version) are indexed.
+        """
+        with self._lock:
+            indexed = dict(self.connection.execute("SELECT chat_id, part_count FROM sessions"))
+            with self.connection:
+                for chat_id, chat in chat_history.items():
+                    part_count = indexed.get(chat_id, 0)
+                    position = 0
+                    for turn_index, turn in enumerate(chat["turns"]):
+                        for part in turn["parts"]:
+                            if position >= part_count:
+                                self._add(chat_id, turn_index, turn["role"], part)
+                            position += 1
+                    if chat_id not in indexed:
+                        self._add_session(chat_id, chat["created_at"], chat["turns"])
+                    if position != part_count:
+                        self.connection.execute(
+                            "UPDATE sessions SET part_count = ? WHERE chat_id = ?",
+                            (position, chat_id),
+                        )
+
+    def add(self, chat_id, created_at, turn_index, role, part):
+        """Index a part added to a chat."""
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO sessions (chat_id, created_at, preview) VALUES (?, ?, ?)",
+                (chat_id, created_at, self.get_part_text(part)[: self.PREVIEW_CHARS]),
+            )
+            self._add(chat_id, turn_index, role, part)
+            self.connection.execute(
+                "UPDATE sessions SET part_count = part_count + 1 WHERE chat_id = ?", (chat_id,)
+            )
+
+    def _add(self, chat_id, turn_index, role, part):
+        content = self.get_part_text(part)
+        if content:
+            self.connection.execute(
+                "INSERT INTO parts (chat_id, turn, role, content) VALUES (?, ?, ?, ?)",
+                (chat_id, turn_index, role, content),
+            )
+
+    def _add_session(self, chat_id, created_at, turns):
+        # Prefer the first text message, like the preview of the sessions created live
+        parts = [part for turn in turns for part in turn["parts"]]
+        texts = [part["text"] for part in parts if part.get("text")]
+        preview = texts[0] if texts else next(filter(None, map(self.get_part_text, parts)), "")
+        self.connection.execute(
+            "INSERT OR IGNORE INTO sessions (chat_id, created_at, preview) VALUES (?, ?, ?)",
+            (chat_id, created_at, preview[: self.PREVIEW_CHARS]),
+        )
+
+    def get_part_text(self, part):
+        """Return the searchable text of a history part, whatever its type."""
+        if "text" in part:
+            text = part["text"]
+        elif "function_call" in part:
+            args = part["function_call"].get("args") or {}
+            text = f"{part['function_call']['name']} {json.dumps(args, ensure_ascii=False)}"
+        elif "function_response" in part:
+            # The large responses stored in the blob store are indexed by their preview
+            response = part["function_response"].get("response")
+            if response is None:
+                response = part["function_response"].get("preview", "")
+            if not isinstance(response, str):
+                response = json.dumps(response, ensure_ascii=False)
+            text = f"{part['function_response']['name']} {response}"
+        elif "file_data" in part:
+            text = part["file_data"].get("original_path") or part["file_data"].get("uri", "")
+        elif "original_path" in part:
+            text = part["original_path"]
+        else:
+            text = ""
+        return (text or "")[: self.MAX_PART_CHARS]
+
+    def get_sessions(self):
+        """Return the indexed sessions as dicts with chat_id, created_at and preview."""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT chat_id, created_at, preview FROM sessions ORDER BY rowid"
+            ).fetchall()
+        return [{"chat_id": row[0], "created_at": row[1], "preview": row[2]} for row in rows]
+
+    def search(self, query, limit=20):
+        """
+        Search the chat history.
+
+        Args:
+            query (str): The words to search; the last word also matches as a prefix.
+            limit (int, optional): The maximum number of hits.
+
+        Returns:
+            list: Hits ordered by relevance, as dicts with chat_id, created_at, turn, role
+                  and snippet.
+        """
+        words = query.split()
+        if not words:
+            return []
+        with self._lock:
+            if self.has_fts:
+                match = " ".join('"' + word.replace('"', '""') + '"' for word in words) + "*"
+                rows = self.connection.execute(
+                    "SELECT parts.chat_id, sessions.created_at, parts.turn, parts.role, "
+                    "snippet(parts, 3, '**', '**', '...', ?) FROM parts "
+                    "LEFT JOIN sessions ON sessions.chat_id = parts.chat_id "
+                    "WHERE parts MATCH ? ORDER BY rank LIMIT ?",
+                    (self.SNIPPET_TOKENS, match, limit),
+                ).fetchall()
+            else:
+                conditions = " AND ".join("parts.content LIKE ?" for _ in words)
+                rows = self.connection.execute(
+                    "SELECT parts.chat_id, sessions.created_at, parts.turn, parts.role, "
+                    f"substr(parts.content, 1, 200) FROM parts "
+                    "LEFT JOIN sessions ON sessions.chat_id = parts.chat_id "
+                    f"WHERE {conditions} ORDER BY parts.rowid DESC LIMIT ?",
+                    [f"%{word}%" for word in words] + [limit],
+                ).fetchall()
+        return [
+            {
+                "chat_id": row[0],
+                "created_at": row[1],
+                "turn": row[2],
+                "role": row[3],
+                "snippet": " ".join(row[4].split()),
+            }
+            for row in rows
+        ]
+
+    def get_search_markdown(self, query, limit=20):
+        """Return the search hits as a Markdown list."""
+        hits = self.search(query, limit)
+        if not hits:
+            return f"No results for: {query}"
+        lines = [f"## Results for: {query}\n"]
+        for index, hit in enumerate(hits, start=1):
+            lines.append(
+                f"{index}. `{hit['chat_id']}` ({(hit['created_at'] or '')[:19]}, "
+                f"turn {hit['turn']}, {hit['role']}): {hit['snippet']}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,95 @@
+"""
+This module persists the chat history of the GeminiSH application.
+Parts added during a turn only mark the history as dirty; the history is written once
+per turn (group commit), or after HISTORY_FLUSH_INTERVAL seconds if a turn runs longer.
+Every write goes to a temporary file that replaces history.json atomically, so a crash
+never leaves a truncated history, and it is fsynced according to HISTORY_FSYNC.
+"""
+
+import os
+import json
+import atexit
+import threading
+
+
+class HistoryWriter:
+    """
+    Writes the chat history file.
+
+    Attributes:
+        history_file (str): The path of history.json.
+        owner (ChatManager): The chat manager whose chat_history is written; it is read at
+            every write, so replacing the history of the owner is picked up.
+        lock (threading.RLock): The lock that guards the history.
+        dirty (bool): Whether the history changed since the last write.
+        fsync (str): "always" (file and directory), "file" or "never".
+    """
+
+    FSYNC_POLICIES = ["always", "file", "never"]
+
+    def __init__(self, config_manager, history_file, owner, lock):
+        self.config_manager = config_manager
+        self.history_file = history_file
+        self.owner = owner
+        self.lock = lock
+        self.dirty = False
+        self.fsync = config_manager.config["HISTORY_FSYNC"]
+        if self.fsync not in self.FSYNC_POLICIES:
+            self.fsync = "file"
+        self.flush_interval = config_manager.config["HISTORY_FLUSH_INTERVAL"]
+        self._timer = None
+        atexit.register(self.flush)
+
+    def mark_dirty(self):
+        """Record that the history changed; it is written by the next flush."""
+        with self.lock:
+            self.dirty = True
+            if self._timer is None and self.flush_interval:
+                # Bounds what a crash can lose during a long turn
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write the history if it changed since the last write."""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.dirty:
+                return 0
+            return self.write()
+
+    def write(self):
+        """
+        Write the history atomically: to a temporary file that then replaces the history.
+
+        Returns:
+            int: The number of bytes written.
+        """
+        temp_file = f"{self.history_file}.tmp"
+        with self.lock:
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(self.owner.chat_history, f, indent=4)
+                size = f.tell()
+                if self.fsync != "never":
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_file, self.history_file)
+            if self.fsync == "always":
+                self.fsync_directory()
+            self.dirty = False
+        return size
+
+    def fsync_directory(self):
+        """Make the rename durable by syncing the directory entry (POSIX only)."""
+        try:
+            directory_fd = os.open(os.path.dirname(self.history_file), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(directory_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(directory_fd)
@@ -0,0 +1,259 @@
+"""
+This module extracts readable text from HTML documents for the GeminiSH application.
+It parses the document incrementally, so pages can be fed chunk by chunk while they
+are being downloaded, and it stops collecting text once the configured size cap is
+reached.
+"""
+
+import re
+from html.parser import HTMLParser
+
+
+class HtmlExtractor(HTMLParser):
+    """
+    Streaming HTML to text/Markdown extractor.
+
+    Scripts, styles and navigation boilerplate (nav, header, footer, aside, forms...)
+    are dropped. When the document has a <main> or <article> element only its content
+    is kept, otherwise the whole <body> is used.
+
+    Attributes:
+        output_format (str): "markdown" or "text".
+        max_chars (int): Maximum number of characters to produce (0 means no limit).
+        title (str): The content of the <title> tag, if any.
+        is_full (bool): True once max_chars has been reached; callers can stop feeding.
+    """
+
+    SKIP_TAGS = {
+        "script",
+        "style",
+        "noscript",
+        "template",
+        "svg",
+        "canvas",
+        "iframe",
+        "nav",
+        "header",
+        "footer",
+        "aside",
+        "form",
+        "button",
+        "select",
+        "head",
+    }
+    SECTION_TAGS = {"header", "footer"}
+    MAIN_TAGS = {"main", "article"}
+    # Containers of the whole page, their classes describe the page layout (e.g. "has-sidebar")
+    STRUCTURAL_TAGS = {"html", "body", "main", "article"}
+    # Without a main region yet, how far past max_chars to keep reading in search of one
+    MAIN_SEARCH_FACTOR = 4
+    VOID_TAGS = {
+        "area", "base", "br", "col", "embed", "hr", "img", "input",
+        "link", "meta", "param", "source", "track", "wbr",
+    }
+    BLOCK_TAGS = {
+        "p", "div", "section", "table", "tr", "ul", "ol", "dl", "blockquote",
+        "pre", "figure", "figcaption", "dd", "dt", "main", "article", "body",
+    }
+    HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+    BOILERPLATE_PATTERN = re.compile(
+        r"(^|[\s_-])(nav|navbar|menu|breadcrumb|sidebar|footer|header|cookie|banner|"
+        r"advert|ads|share|social|related|comments?|popup|modal|newsletter)($|[\s_-])",
+        re.IGNORECASE,
+    )
+
+    def __init__(self, output_format="markdown", max_chars=0):
+        super().__init__(convert_charrefs=True)
+        self.output_format = output_format
+        self.max_chars = max_chars
+        self.title = ""
+        self.is_full = False
+        self._markdown = output_format == "markdown"
+        self._skip_depth = 0
+        self._skip_stack = []
+        self._in_title = False
+        self._in_pre = 0
+        self._list_stack = []
+        self._link_href = None
+        self._body_chunks = []
+        self._main_chunks = []
+        self._main_depth = 0
+        self._last_chunk = ""
+        self._length = 0
+        self._body_length = 0
+        self._main_length = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "title":
+            self._in_title = True
+            return
+        if self._skip_depth:
+            if tag not in self.VOID_TAGS:
+                self._skip_stack.append(tag)
+                self._skip_depth += 1
+            return
+        if self._main_depth and tag in self.SECTION_TAGS:
+            # Article headers usually hold the headline, keep them inside main content
+            pass
+        elif tag in self.SKIP_TAGS or self._is_boilerplate(tag, attrs):
+            if tag not in self.VOID_TAGS:
+                self._skip_stack.append(tag)
+                self._skip_depth = 1
+            return
+        if tag in self.MAIN_TAGS:
+            self._main_depth += 1
+
+        if tag in self.HEADINGS:
+            self._block()
+            if self._markdown:
+                self._write("#" * self.HEADINGS[tag] + " ")
+        elif tag in ("ul", "ol"):
+            self._list_stack.append([tag, 0])
+            self._block()
+        elif tag == "li":
+            self._newline()
+            indent = "  " * max(len(self._list_stack) - 1, 0)
+            if self._list_stack and self._list_stack[-1][0] == "ol":
+                self._list_stack[-1][1] += 1
+                self._write(f"{indent}{self._list_stack[-1][1]}. ")
+            else:
+                self._write(f"{indent}- ")
+        elif tag == "br":
+            self._newline()
+        elif tag == "pre":
+            self._block()
+            self._in_pre += 1
+            if self._markdown:
+                self._write("```\n")
+        elif tag in ("td", "th"):
+            self._write(" | ")
+        elif tag == "a" and self._markdown:
+            self._link_href = attrs.get("href")
+            self._write("[")
+        elif tag in ("strong", "b") and self._markdown:
+            self._write("**")
+        elif tag in ("code",) and self._markdown and not self._in_pre:
+            self._write("`")
+        elif tag == "img" and self._markdown and attrs.get("alt"):
+            self._write(f"[image: {attrs['alt']}]")
+        elif tag in self.BLOCK_TAGS:
+            self._block()
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+            return
+        if self._skip_depth:
+            if tag in self._skip_stack:
+                # Close everything opened after the matching tag (tolerates unclosed tags)
+                while self._skip_stack:
+                    self._skip_depth -= 1
+                    if self._skip_stack.pop() == tag:
+                        break
+                self._skip_depth = len(self._skip_stack)
+            return
+        if tag in self.MAIN_TAGS and self._main_depth:
+            self._main_depth -= 1
+
+        if tag in self.HEADINGS:
+            self._block()
+        elif tag in ("ul", "ol"):
+            if self._list_stack:
+                self._list_stack.pop()
+            self._block()
+        elif tag == "pre":
+            if self._in_pre:
+                self._in_pre -= 1
+            if self._markdown:
+                self._newline()
+                self._write("```")
+            self._block()
+        elif tag == "a" and self._markdown:
+            href = self._link_href
+            self._link_href = None
+            if href and not href.startswith(("#", "javascript:")):
+                self._write(f"]({href})")
+            else:
+                self._write("]")
+        elif tag in ("strong", "b") and self._markdown:
+            self._write("**")
+        elif tag in ("code",) and self._markdown and not self._in_pre:
+            self._write("`")
+        elif tag in self.BLOCK_TAGS:
+            self._block()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data.strip()
+            return
+        if self._skip_depth:
+            return
+        if not self._in_pre:
+            data = re.sub(r"\s+", " ", data)
+            if not data.strip() and self._ends_with_whitespace():
+                return
+        self._write(data)
+
+    def get_text(self):
+        """Return the extracted content, preferring the main/article content if present."""
+        main_text = "".join(self._main_chunks)
+        if main_text.strip():
+            text, length = main_text, self._main_length
+        else:
+            text, length = "".join(self._body_chunks), self._body_length
+        text = re.sub(r"[ \t]+\n", "\n", text)
+        text = re.sub(r"\n{3,}", "\n\n", text).strip()
+        if self.max_chars and len(text) > self.max_chars:
+            text = text[: self.max_chars]
+        if self.max_chars and length >= self.max_chars:
+            text += "\n\n[...content truncated...]"
+        return text
+
+    def _is_boilerplate(self, tag, attrs):
+        """Check whether the element is navigation or advertising boilerplate."""
+        if attrs.get("role") in ("navigation", "banner", "contentinfo", "complementary"):
+            return True
+        if attrs.get("aria-hidden") == "true" or "hidden" in attrs:
+            return True
+        if tag in self.STRUCTURAL_TAGS:
+            return False
+        for name in ("id", "class"):
+            value = attrs.get(name)
+            if value and self.BOILERPLATE_PATTERN.search(value):
+                return True
+        return False
+
+    def _write(self, text):
+        if self.is_full or not text:
+            return
+        self._last_chunk = text
+        self._length += len(text)
+        # The body and the main content are capped separately, so a long preamble does not
+        # use up the size of the main content that comes after it
+        if not self.max_chars or self._body_length < self.max_chars:
+            self._body_chunks.append(text)
+            self._body_length += len(text)
+        if self._main_depth:
+            self._main_chunks.append(text)
+            self._main_length += len(text)
+        if self.max_chars:
+            if self._main_length:
+                self.is_full = self._main_length >= self.max_chars
+            else:
+                self.is_full = self._length >= self.max_chars * self.MAIN_SEARCH_FACTOR
+
+    def _ends_with_whitespace(self):
+        if not self._last_chunk:
+            return True
+        return self._last_chunk[-1:].isspace()
+
+    def _newline(self):
+        if self._last_chunk and not self._last_chunk.endswith("\n"):
+            self._write("\n")
+
+    def _block(self):
+        if self._last_chunk:
+            last = self._last_chunk
+            if not last.endswith("\n\n"):
+                self._write("\n" if last.endswith("\n") else "\n\n")
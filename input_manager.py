@@ -9,7 +9,10 @@ from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
 from prompt_toolkit.shortcuts import CompleteStyle
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.keys import Keys
-from rich.prompt import Prompt
+from lazy_module import LazyModule
+from session_manager import get_current_session
+
+rich_prompt = LazyModule("rich.prompt")
 
 
 class InputManager:
@@ -17,7 +20,8 @@ class InputManager:
     The InputManager class handles user input operations for the GeminiSH application.
     It manages command history, auto-suggestions, and key bindings for an enhanced user
     experience. The class is designed as a singleton to ensure consistent input handling
-    across the application.
+    across the application. Inside a session, the questions are answered by the session
+    instead of the terminal.
     """
     
     _instance = None
@@ -54,6 +58,9 @@ class InputManager:
 
     def input(self, message="[bold green]> [/bold green]"):
         """Read a message from the user."""
+        session = get_current_session()
+        if session:
+            return session.ask(message)
         if self.output_manager:
             with self.output_manager.stop_status():
                 self.output_manager.print(message, end="")
@@ -61,6 +68,11 @@ class InputManager:
 
     def choose(self, text, choices, default=None):
         """Print text to console and wait for user response."""
+        session = get_current_session()
+        if session:
+            return session.ask(text, choices, default)
         if self.output_manager:
             with self.output_manager.stop_status():
-                return Prompt.ask(f"[yellow]{text}[/yellow]", choices=choices, default=default)
+                return rich_prompt.Prompt.ask(
+                    f"[yellow]{text}[/yellow]", choices=choices, default=default
+                )
@@ -0,0 +1,43 @@
+"""
+This module provides lazy imports for the GeminiSH application.
+Heavy dependencies (google.generativeai, protobuf types, rich.markdown...) are only
+imported the first time one of their attributes is used, so starting the application
+does not pay for modules that the current session never needs.
+"""
+
+import importlib
+
+
+class LazyModule:
+    """
+    Proxy for a module that is imported on first attribute access.
+
+    Usage:
+        genai = LazyModule("google.generativeai")
+        genai.configure(api_key=api_key)  # google.generativeai is imported here
+
+    Attributes:
+        name (str): The full name of the proxied module.
+    """
+
+    def __init__(self, name):
+        self.__dict__["name"] = name
+        self.__dict__["_module"] = None
+
+    def load(self):
+        """Import the module if needed and return it."""
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self.load(), attribute, value)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<LazyModule {self.__dict__['name']} ({state})>"
@@ -0,0 +1,164 @@
+"""
+This module reads windows of large text files for the GeminiSH application.
+The file is memory-mapped and a sparse index of line offsets (one checkpoint every
+CHECKPOINT_BYTES, at a line start) is built once per file version and cached, so any line
+can be reached by a bisect and a short scan, and reading a range, the tail or the lines
+matching a pattern of a multi-GB file uses constant memory.
+"""
+
+import os
+import re
+import mmap
+import bisect
+import threading
+from collections import OrderedDict
+
+
+class LineIndex:
+    """
+    Sparse line index of a file.
+
+    Attributes:
+        file_path (str): The real path of the file.
+        signature (tuple): The (mtime, size) of the indexed version of the file.
+        line_count (int): The number of lines of the file.
+        checkpoint_lines (list): The line number at every checkpoint.
+        checkpoint_offsets (list): The byte offset of every checkpoint.
+    """
+
+    CHECKPOINT_BYTES = 64 * 1024
+    CACHE_SIZE = 16
+
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, file_path, signature):
+        self.file_path = file_path
+        self.signature = signature
+        self.checkpoint_lines = [0]
+        self.checkpoint_offsets = [0]
+        self.line_count = 0
+        self.build()
+
+    @classmethod
+    def get(cls, file_path):
+        """Return the index of a file, from the cache if the file did not change."""
+        file_path = os.path.realpath(file_path)
+        stat = os.stat(file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with cls._cache_lock:
+            index = cls._cache.get(file_path)
+            if index is not None and index.signature == signature:
+                cls._cache.move_to_end(file_path)
+                return index
+        index = cls(file_path, signature)
+        with cls._cache_lock:
+            cls._cache[file_path] = index
+            if len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return index
+
+    def open(self):
+        """Return a read-only mmap of the file, or an empty bytes object for an empty file."""
+        if not self.signature[1]:
+            return b""
+        with open(self.file_path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def build(self):
+        """Count the lines of the file, recording a checkpoint at a line start every 64 KB."""
+        data = self.open()
+        size = len(data)
+        offset = 0
+        lines = 0
+        try:
+            while offset < size:
+                end = data.find(b"\n", min(offset + self.CHECKPOINT_BYTES, size) - 1)
+                end = size if end == -1 else end + 1
+                lines += self.count_newlines(data, offset, end)
+                offset = end
+                if offset < size:
+                    self.checkpoint_lines.append(lines)
+                    self.checkpoint_offsets.append(offset)
+            # A last line without a newline is a line too
+            if size and data[size - 1:size] != b"\n":
+                lines += 1
+            self.line_count = lines
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    def count_newlines(self, data, start, end):
+        """Count the newlines between two offsets, copying at most a checkpoint at a time."""
+        count = 0
+        for chunk_start in range(start, end, self.CHECKPOINT_BYTES):
+            chunk_end = min(chunk_start + self.CHECKPOINT_BYTES, end)
+            count += data[chunk_start:chunk_end].count(b"\n")
+        return count
+
+    def get_offset(self, data, line):
+        """Return the byte offset where a line (0-based) starts."""
+        position = bisect.bisect_right(self.checkpoint_lines, line) - 1
+        offset = self.checkpoint_offsets[position]
+        for _ in range(line - self.checkpoint_lines[position]):
+            offset = data.find(b"\n", offset) + 1
+            if not offset:
+                return len(data)
+        return offset
+
+    def read_lines(self, start, end):
+        """
+        Return the text of the lines from start to end (0-based, end excluded).
+        Invalid UTF-8 sequences are replaced.
+        """
+        start = max(0, start)
+        end = min(self.line_count, end)
+        if start >= end:
+            return ""
+        data = self.open()
+        try:
+            start_offset = self.get_offset(data, start)
+            end_offset = self.get_offset(data, end)
+            return data[start_offset:end_offset].decode("utf-8", errors="replace")
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    def grep(self, pattern, start=0, end=None, max_matches=100):
+        """
+        Return the (line number, line) of the lines matching a regular expression.
+
+        Args:
+            pattern (str): The regular expression.
+            start (int): The first line to search (0-based).
+            end (int, optional): The line where the search stops (excluded).
+            max_matches (int): The maximum number of lines returned.
+        """
+        regex = re.compile(pattern.encode("utf-8"), re.MULTILINE)
+        end = self.line_count if end is None else min(end, self.line_count)
+        matches = []
+        data = self.open()
+        try:
+            start_offset = self.get_offset(data, max(0, start))
+            end_offset = self.get_offset(data, end)
+            position = start_offset
+            line = max(0, start)
+            while len(matches) < max_matches:
+                match = regex.search(data, position, end_offset)
+                if match is None:
+                    break
+                line_start = data.rfind(b"\n", 0, match.start()) + 1
+                line_end = data.find(b"\n", match.start(), end_offset)
+                line_end = end_offset if line_end == -1 else line_end
+                line += self.count_newlines(data, position, line_start)
+                text = data[line_start:line_end].decode("utf-8", errors="replace")
+                matches.append((line, text.rstrip("\r")))
+                # Continue after the line, so a line is returned once
+                position = line_end + 1
+                line += 1
+                if position > end_offset:
+                    break
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        return matches
@@ -5,20 +5,89 @@ It initializes and runs the Gemini Agent, handling any interruptions gracefully.
 """
 
 import os
-from gemini_agent import GeminiAgent
+import re
+import sys
+import time
+import subprocess
 
 DEBUG = os.environ.get("DEBUG", False)
+PROFILE_STARTUP_FLAG = "--profile-startup"
+SERVE_FLAG = "--serve"
+PROFILE_TOP_MODULES = 25
 
 
 def main():
     """Main function to handle the execution of the Gemini Agent."""
+    if PROFILE_STARTUP_FLAG in sys.argv[1:]:
+        profile_startup()
+        return
+
+    from gemini_agent import GeminiAgent
+
     agent = GeminiAgent()
+    if SERVE_FLAG in sys.argv[1:]:
+        serve(agent)
+        return
     try:
         agent.run()
     except KeyboardInterrupt:
         agent.exit()
 
 
+def serve(agent):
+    """Serve the agent over the local HTTP API, see api_server.py."""
+    from api_server import ApiServer
+
+    server = ApiServer(agent)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        agent.output_manager.print("\n[yellow]API server stopped.[/yellow]")
+
+
+def profile_startup():
+    """Report the time to prompt and the modules that take the longest to import."""
+    root_directory = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import gemini_agent"],
+        cwd=root_directory,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode:
+        print(result.stderr.splitlines()[-1] if result.stderr else "Import failed.")
+    imports = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)", line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            depth = (len(indent) - 1) // 2
+            imports.append((int(self_us), int(cumulative_us), depth, module))
+
+    print(f"\nTop {PROFILE_TOP_MODULES} top-level imports by cumulative time:")
+    top_level = sorted((i for i in imports if i[2] == 0), key=lambda i: i[1], reverse=True)
+    for self_us, cumulative_us, _, module in top_level[:PROFILE_TOP_MODULES]:
+        print(f"{cumulative_us / 1000:10.1f} ms  {module}")
+
+    print(f"\nTop {PROFILE_TOP_MODULES} modules by self time:")
+    for self_us, _, _, module in sorted(imports, reverse=True)[:PROFILE_TOP_MODULES]:
+        print(f"{self_us / 1000:10.1f} ms  {module}")
+
+    start = time.perf_counter()
+    from gemini_agent import GeminiAgent
+
+    imported = time.perf_counter()
+    agent = GeminiAgent()
+    ready = time.perf_counter()
+    agent.model_manager.wait_until_ready()
+    model_ready = time.perf_counter()
+    print(f"\nImport gemini_agent: {(imported - start) * 1000:.1f} ms")
+    print(f"Initialize agent:    {(ready - imported) * 1000:.1f} ms")
+    print(f"Time to prompt:      {(ready - start) * 1000:.1f} ms")
+    print(f"Model ready:         {(model_ready - start) * 1000:.1f} ms")
+
+
 if __name__ == "__main__":
     try:
         main()
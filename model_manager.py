@@ -3,12 +3,31 @@ This module manages the interaction with the Google Gemini model.
 """
 
 import os
-import google.generativeai as genai
-from google.ai.generativelanguage import Tool, Content, Part
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from lazy_module import LazyModule
+from telemetry_manager import TelemetryManager
+from tool_router import ToolRouter
+from response_encoder import ResponseEncoder
+from cache_manager import CacheManager
+from session_manager import get_current_session
+
+genai = LazyModule("google.generativeai")
+caching = LazyModule("google.generativeai.caching")
+glm = LazyModule("google.ai.generativelanguage")
 
 DEBUG = os.environ.get("DEBUG", False)
 
 
+class GenerationCancelled(Exception):
+    """Raised when the user cancels a model request, with the text received until then."""
+
+    def __init__(self, partial_text=""):
+        super().__init__("Request cancelled by the user")
+        self.partial_text = partial_text
+
+
 class ModelManager:
     """
     The ModelManager class handles interactions with the Google Gemini model.
@@ -38,8 +57,22 @@ class ModelManager:
         self.function_manager = function_manager
         self.output_manager = output_manager
         self.input_manager = input_manager
-        self.chat_manager = chat_manager
-        self.model = self.init_model()
+        self._chat_manager = chat_manager
+        self.telemetry_manager = TelemetryManager()
+        self.tool_router = ToolRouter(config_manager, function_manager)
+        self.response_encoder = ResponseEncoder(config_manager, CacheManager())
+        # The tools of a cached content model are part of the cache and cannot be routed
+        self.uses_cached_content = False
+        self.model = None
+        self._ready = threading.Event()
+        self._init_error = None
+        self._functions_loaded = False
+
+    @property
+    def chat_manager(self):
+        """The chat manager of the active session, or the one of the terminal REPL."""
+        session = get_current_session()
+        return session.chat_manager if session else self._chat_manager
 
     def first_message(self):
         """Method to send the first message to the model."""
@@ -55,6 +88,49 @@ class ModelManager:
                     first_runs_text = f.read()
                     self.output_manager.print(first_runs_text, style="blue", markdown=True)
 
+    def start_initialization(self, background=True):
+        """
+        Load the functions and initialize the model.
+
+        With background=True this runs on a background thread, so the REPL prompt comes up
+        at once; the API key is read first on the calling thread because it may have to
+        be asked to the user. Requests wait for the initialization, see wait_until_ready.
+        """
+        self.get_api_key()
+        if background:
+            threading.Thread(target=self._initialize, name="ModelInit", daemon=True).start()
+        else:
+            self._initialize()
+
+    def _initialize(self):
+        try:
+            with self.telemetry_manager.span("initialize", "startup"):
+                # A retry after a failed model initialization does not load them again
+                if not self._functions_loaded:
+                    self.function_manager.load_all_functions()
+                    self._functions_loaded = True
+                self.model = self.init_model()
+        except Exception as e:
+            self._init_error = e
+        finally:
+            self._ready.set()
+
+    def wait_until_ready(self):
+        """
+        Wait until the functions and the model are initialized.
+
+        Raises:
+            Exception: The error of the initialization, which is then retried on the next call.
+        """
+        if not self._ready.is_set():
+            with self.output_manager.managed_status("[bold blue]Gemini is starting...[/bold blue]"):
+                self._ready.wait()
+        if self._init_error:
+            error, self._init_error = self._init_error, None
+            self._ready.clear()
+            threading.Thread(target=self._initialize, name="ModelInit", daemon=True).start()
+            raise error
+
     def get_api_key(self):
         """Checks if the GOOGLE_API_KEY is set, if not, prompts the user to enter it."""
         if self.config_manager.config["GOOGLE_API_KEY"]:
@@ -76,14 +152,24 @@ class ModelManager:
         model_name = self.config_manager.config["MODEL_NAME"]
         # max_output_tokens = self.config_manager.config["MODEL_MAX_OUTPUT_TOKENS"]
         safety_settings = self.config_manager.config["MODEL_SAFETY_SETTINGS"]
-        system_instructions = (
-            self.state_manager.state["system_instructions"]
-            + self.config_manager.get_system_information()
+        # Already includes the system information, see PromptBuilder
+        system_instructions = self.state_manager.state["system_instructions"]
+        functions_tools = glm.Tool(
+            function_declarations=self.function_manager.get_as_declarations()
         )
-        functions_tools = Tool(function_declarations=self.function_manager.get_as_declarations())
         self.output_manager.debug(f"Model name: {model_name}")
         api_key = self.get_api_key()
         genai.configure(api_key=api_key)
+
+        self.uses_cached_content = False
+        if self.config_manager.config["PROMPT_CONTEXT_CACHE"]:
+            model = self.get_cached_content_model(
+                model_name, system_instructions, functions_tools, safety_settings
+            )
+            if model:
+                self.uses_cached_content = True
+                return model
+
         model = genai.GenerativeModel(
             model_name,
             # generation_config=genai.GenerationConfig(max_output_tokens=max_output_tokens),
@@ -93,15 +179,94 @@ class ModelManager:
         )
         return model
 
+    def get_cached_content_model(
+        self, model_name, system_instructions, functions_tools, safety_settings
+    ):
+        """
+        Returns a model that uses a cached content with the system prompt and the tools, or
+        None if the prompt is too small to be cached or the cache could not be created.
+
+        The cached content is reused across runs while the prompt, the tools and the model
+        are byte-identical and it has not expired.
+        """
+        prompt_builder = self.state_manager.prompt_builder
+        try:
+            token_count = prompt_builder.get_token_count()
+            if token_count is None:
+                token_count = (
+                    genai.GenerativeModel(model_name).count_tokens(system_instructions).total_tokens
+                )
+                prompt_builder.set_token_count(token_count)
+            if token_count < self.config_manager.config["PROMPT_CONTEXT_CACHE_MIN_TOKENS"]:
+                self.output_manager.debug(f"System prompt too small to be cached: {token_count}")
+                return None
+
+            key = prompt_builder.hash(
+                model_name + system_instructions + type(functions_tools).to_json(functions_tools)
+            )
+            cached_content = None
+            entry = prompt_builder.get_cached_content(key)
+            if entry and datetime.fromisoformat(entry["expire_time"]) > datetime.now(
+                timezone.utc
+            ) + timedelta(minutes=1):
+                try:
+                    cached_content = caching.CachedContent.get(entry["name"])
+                except Exception as e:
+                    self.output_manager.debug(f"Cached content not available: {e}")
+
+            if cached_content is None:
+                cached_content = caching.CachedContent.create(
+                    model=model_name,
+                    system_instruction=system_instructions,
+                    tools=[functions_tools],
+                    ttl=timedelta(minutes=self.config_manager.config["PROMPT_CONTEXT_CACHE_TTL"]),
+                )
+                prompt_builder.set_cached_content(
+                    key, cached_content.name, cached_content.expire_time.isoformat()
+                )
+            self.output_manager.debug(f"Using cached content: {cached_content.name}")
+            return genai.GenerativeModel.from_cached_content(
+                cached_content, safety_settings=safety_settings
+            )
+        except Exception as e:
+            self.output_manager.debug(f"Context cache disabled: {e}")
+            return None
+
+    def refresh_functions(self):
+        """Apply the pending reloads of function modules and refresh the model tools."""
+        self.wait_until_ready()
+        if self.function_manager.apply_pending_reloads():
+            self.tool_router.clear()
+            self.model = self.init_model()
+            self.output_manager.debug("Model tools refreshed after reloading functions")
+
     def generate_content(self):
         """Method to send a message to the model."""
         if DEBUG:
             for part in self.chat_manager.current_chat:
                 self.output_manager.debug(f"Chat part: {part}", 2)
         try:
+            self.refresh_functions()
+            contents = self.chat_manager.get_model_chat()
+            request_options = {}
+            if not self.uses_cached_content and self.tool_router.is_active():
+                tools = self.tool_router.get_tools(self.chat_manager.current_chat)
+                if tools:
+                    request_options["tools"] = tools
             with self.output_manager.managed_status("[bold blue]Gemini is thinking...[/bold blue]"):
-                response = self.model.generate_content(self.chat_manager.current_chat)
-            return self.handle_gemini_response(response)
+                with self.telemetry_manager.span(
+                    "generate_content",
+                    "model",
+                    bytes_out=sum(type(content).pb(content).ByteSize() for content in contents),
+                ) as span:
+                    if "tools" in request_options:
+                        span["tools"] = len(request_options["tools"].function_declarations)
+                    response_dict = self.request_content(contents, request_options)
+                    span.update(self.get_usage_attributes(response_dict))
+            return self.handle_gemini_response(response_dict)
+        except GenerationCancelled as e:
+            self.handle_cancelled_generation(e.partial_text)
+            return None
         except Exception as e:
             self.output_manager.print(f"An error occurred: {e}", style="bold red")
             choice = self.input_manager.choose(
@@ -110,15 +275,73 @@ class ModelManager:
             if choice == "yes":
                 return self.generate_content()
 
+    def request_content(self, contents, request_options):
+        """
+        Send a streamed request on a worker thread and return the response as a dict.
+        The calling thread only waits for it, so Ctrl+C cancels the request at once
+        (instead of waiting for the network call) without ending the session.
+
+        Raises:
+            GenerationCancelled: On Ctrl+C, with the text streamed until then.
+        """
+        result = {"texts": [], "response": None, "error": None}
+        cancelled = threading.Event()
+
+        def stream():
+            try:
+                response = self.model.generate_content(contents, stream=True, **request_options)
+                for chunk in response:
+                    if cancelled.is_set():
+                        return
+                    chunk_dict = type(chunk).to_dict(chunk)
+                    for candidate in chunk_dict.get("candidates", [])[:1]:
+                        for part in (candidate.get("content") or {}).get("parts", []):
+                            if part.get("text"):
+                                result["texts"].append(part["text"])
+                result["response"] = response
+            except Exception as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=stream, name="GenerateContent", daemon=True)
+        thread.start()
+        try:
+            while thread.is_alive():
+                thread.join(0.1)
+        except KeyboardInterrupt as e:
+            # The thread stops at the next chunk; its response is discarded
+            cancelled.set()
+            raise GenerationCancelled("".join(result["texts"])) from e
+        if result["error"]:
+            raise result["error"]
+        response = result["response"]
+        return type(response).to_dict(response)
+
+    def handle_cancelled_generation(self, partial_text):
+        """Keep the text received before the user cancelled a request and go back to the prompt."""
+        if partial_text.strip():
+            self.output_manager.print(partial_text, style="blue", markdown=True)
+            self.chat_manager.add_text_part("model", f"{partial_text.strip()}\n[interrupted]\n  ")
+        self.output_manager.warning("Request cancelled.")
+
     def message_to_proto(self, message):
         """Converts a message into a proto Content object."""
         if isinstance(message, str):
-            return Content(role="user", parts=[Part(text=message)])
+            return glm.Content(role="user", parts=[glm.Part(text=message)])
 
-    def handle_gemini_response(self, response):
-        """Handles the response from Google Gemini, extracting text and executing functions."""
-        response_dict = type(response).to_dict(response)
+    def get_usage_attributes(self, response_dict):
+        """Returns the telemetry attributes (sizes, tokens and cache use) of a response."""
+        usage = response_dict.get("usage_metadata") or {}
+        cached_tokens = usage.get("cached_content_token_count", 0)
+        return {
+            "bytes_in": len(json.dumps(response_dict, default=str)),
+            "prompt_tokens": usage.get("prompt_token_count", 0),
+            "output_tokens": usage.get("candidates_token_count", 0),
+            "cached_tokens": cached_tokens,
+            "cache_hit": cached_tokens > 0,
+        }
 
+    def handle_gemini_response(self, response_dict):
+        """Handles the response from Google Gemini, extracting text and executing functions."""
         if not (
             response_dict.get("candidates")
             and response_dict["candidates"][0].get("content")
@@ -132,7 +355,10 @@ class ModelManager:
             return None
 
         function_responses = []
+        cancelled = False
         for part in response_dict["candidates"][0]["content"]["parts"]:
+            if cancelled:
+                break
             self.output_manager.debug(f"Part: {part}")
             try:
                 if "text" in part:
@@ -152,16 +378,52 @@ class ModelManager:
                             f"Function name: {function_name} | Function args: {function_args}"
                         )
                         self.chat_manager.add_function_call("model", function_name, function_args)
-                        response = self.function_manager.execute_function(
-                            function_name, function_args
-                        )
+                        try:
+                            response = self.function_manager.execute_function(
+                                function_name, function_args
+                            )
+                        except KeyboardInterrupt:
+                            cancelled = True
+                            response = "[error]Function execution cancelled by the user[/error]"
                         function_responses.append((function_name, response))
             except Exception as e:
                 print(e)
 
+        if cancelled:
+            # Every function call needs its response in the chat, but the model is not
+            # called again: the user gets the prompt back
+            for function_name, response in function_responses:
+                if isinstance(response, dict):
+                    response = response.get("response", "")
+                self.add_function_response(function_name, response)
+            self.output_manager.warning("Function execution cancelled.")
+            return None
+
         for function_name, response in function_responses:
             self.handle_function_response(function_name, response)
 
+    def add_function_response(self, function_name, response):
+        """
+        Add the response of a function to the chat, packed by the ResponseEncoder.
+        A result too large to be sent inline is uploaded as a file after the response.
+        """
+        with self.telemetry_manager.span("encode_response", "function") as span:
+            text, file_path = self.response_encoder.encode(function_name, response)
+            span["bytes_out"] = len(text)
+        files = []
+        if file_path:
+            upload_response = self.function_manager.execute_function(
+                "upload_files", {"file_paths": [file_path]}
+            )
+            if isinstance(upload_response, dict):
+                files = upload_response["response_to_agent"]["files"]
+            else:
+                # The upload failed, the model gets the whole result inline instead
+                text = self.response_encoder.pack(response)
+        self.chat_manager.add_function_response("user", function_name, text)
+        for file in files:
+            self.chat_manager.add_file(file)
+
     def handle_function_response(self, function_name, function_response):
         """
         Handles the response from a function call.
@@ -176,15 +438,27 @@ class ModelManager:
             - If the function response is a dictionary, it processes the response and 
               adds it to the chat manager. It also handles any additional responses 
               directed to the agent.
+            - If the response is the content of a file already loaded in the chat, only the
+              diff against the loaded version is added, when it is shorter.
             - Finally, it triggers the generation of new content based on the function response.
         """
         if isinstance(function_response, str):
-            self.chat_manager.add_function_response("user", function_name, function_response)
+            self.add_function_response(function_name, function_response)
         elif isinstance(function_response, dict):
             if "response" in function_response:
-                self.chat_manager.add_function_response(
-                    "user", function_name, function_response["response"]
+                response = function_response["response"]
+                # A file already in the chat is sent as a diff against the version it has
+                file_content = (function_response.get("response_to_agent") or {}).get(
+                    "file_content"
                 )
+                is_delta = False
+                if file_content:
+                    delta = self.chat_manager.get_file_delta(**file_content)
+                    if delta is not None and len(delta) < len(response):
+                        response, is_delta = delta, True
+                self.add_function_response(function_name, response)
+                if file_content:
+                    self.chat_manager.set_file_version(**file_content, is_delta=is_delta)
             if "response_to_agent" in function_response:
                 self.function_manager.handle_functions_response(
                     function_response["response_to_agent"]
@@ -6,7 +6,11 @@ import os
 import inspect
 from contextlib import contextmanager
 from rich.console import Console
-from rich.markdown import Markdown
+from telemetry_manager import TelemetryManager
+from session_manager import get_current_session
+from lazy_module import LazyModule
+
+rich_markdown = LazyModule("rich.markdown")
 
 DEBUG = 1 if os.getenv("DEBUG", "False") == "True" else 0
 
@@ -15,6 +19,7 @@ class OutputManager:
     """
     Manages output to the console, including printing, debugging, warnings, and status messages.
     This class is designed as a singleton to ensure consistent output handling.
+    Inside a session, the output goes to the console and status of the active session.
     """
 
     _instance = None
@@ -26,10 +31,17 @@ class OutputManager:
 
     def __init__(self, config_manager=None):
         if not hasattr(self, "initialized"):  # Ensure __init__ is only called once
-            self.console = Console()
+            self.default_console = Console()
             self._status_stack = []
             self.initialized = True
             self.config_manager = config_manager
+            self.telemetry_manager = TelemetryManager()
+
+    @property
+    def console(self):
+        """The console of the active session, or the terminal console."""
+        session = get_current_session()
+        return session.console if session else self.default_console
 
     def print(self, text, markdown=False, style="", end="\n"):
         """
@@ -44,7 +56,8 @@ class OutputManager:
         if not text:
             return
         if markdown:
-            self.console.print(Markdown(text, style=style))
+            with self.telemetry_manager.span("markdown", "render", bytes_out=len(text)):
+                self.console.print(rich_markdown.Markdown(text, style=style))
         else:
             self.console.print(text, end=end)
 
@@ -85,6 +98,15 @@ class OutputManager:
         """
         self.console.print(f"[yellow][bold]WARNING:[/bold] {text}[/yellow]")
 
+    def error(self, text):
+        """
+        Prints an error message to the console.
+
+        Args:
+            text (str): The error message to print.
+        """
+        self.console.print(f"[red][bold]ERROR:[/bold] {text}[/red]")
+
     @contextmanager
     def managed_status(self, message):
         """
@@ -94,6 +116,17 @@ class OutputManager:
         Args:
             message (str): The status message to display.
         """
+        session = get_current_session()
+        if session:
+            session.status_stack.append(message)
+            session.stream.emit("status", message)
+            try:
+                yield
+            finally:
+                session.status_stack.pop()
+                session.stream.emit("status", session.status)
+            return
+
         if self._status_stack:
             self._status_stack[-1].stop()
 
@@ -113,6 +146,10 @@ class OutputManager:
         Context manager to temporarily stop the current status message,
         execute a block of code, and then restart the status message.
         """
+        if get_current_session():
+            yield
+            return
+
         if self._status_stack:
             self._status_stack[-1].stop()
 
@@ -0,0 +1,256 @@
+"""
+This module keeps an index of the file paths of the working directory of the GeminiSH
+application, so files can be found by name in milliseconds instead of running `find`
+over the whole tree on every request. The listing of every directory is stored with the
+directory modification time in the config directory; a refresh only lists again the
+directories whose modification time changed (a file was created, deleted or renamed in
+them). Searches use a trigram index of the paths, built in memory.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from config_manager import ConfigManager
+from output_manager import OutputManager
+
+
+class PathIndex:
+    """
+    Persistent index of the paths of a directory tree.
+    This class is designed as a singleton so function modules can query the same index.
+
+    Attributes:
+        root (str): The indexed directory, the working directory of the application.
+        index_file (str): The file where the directory listings are stored.
+        directories (dict): Relative directory -> {"mtime", "files", "dirs"}.
+        paths (list): The relative paths of the indexed files.
+    """
+
+    INDEX_DIR = "path_index"
+    EXCLUDED_DIRECTORIES = {
+        ".git", ".svn", ".hg", "node_modules", "bower_components", "__pycache__", ".venv",
+        "venv", ".tox", ".mypy_cache", ".pytest_cache", ".cache", ".geminiSH",
+    }
+    GLOB_CHARACTERS = re.compile(r"[*?\[]")
+    # A glob token: "**/", "**", "*", "?", a character class or one literal character
+    GLOB_TOKEN = re.compile(r"\*\*/|\*\*|\*|\?|\[!?\]?[^\]]*\]|.", re.DOTALL)
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, config_manager=None, output_manager=None, root=None):
+        if not hasattr(self, "initialized"):
+            # Built from the configuration when a function module is loaded first
+            self.config_manager = config_manager or ConfigManager()
+            self.output_manager = output_manager or OutputManager()
+            self.root = os.path.realpath(root or os.getcwd())
+            key = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+            self.index_file = os.path.join(
+                self.config_manager.directory, self.INDEX_DIR, f"{key}.json"
+            )
+            self._lock = threading.RLock()
+            self.directories = None
+            self.paths = []
+            self.trigrams = None
+            self.last_refresh = 0
+            self.initialized = True
+
+    def load(self):
+        """Load the stored directory listings."""
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("root") == self.root:
+                return data["directories"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def save(self):
+        """Store the directory listings atomically."""
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump({"root": self.root, "directories": self.directories}, f)
+        os.replace(temp_file, self.index_file)
+
+    def refresh(self, force=False):
+        """
+        Bring the index up to date, at most every PATH_INDEX_REFRESH_INTERVAL seconds.
+        Only the directories whose modification time changed are listed again.
+        """
+        interval = self.config_manager.config["PATH_INDEX_REFRESH_INTERVAL"]
+        with self._lock:
+            if not force and self.directories is not None:
+                if time.monotonic() - self.last_refresh < interval:
+                    return
+            previous = self.directories if self.directories is not None else self.load()
+            max_files = self.config_manager.config["PATH_INDEX_MAX_FILES"]
+            directories = {}
+            paths = []
+            changed = self.directories is None and not previous
+            pending = [""]
+            while pending and len(paths) < max_files:
+                directory = pending.pop()
+                full_path = os.path.join(self.root, directory)
+                try:
+                    mtime = os.stat(full_path).st_mtime_ns
+                except OSError:
+                    changed = True
+                    continue
+                entry = previous.get(directory)
+                if entry is None or entry["mtime"] != mtime:
+                    entry = self.list_directory(full_path, mtime)
+                    changed = True
+                directories[directory] = entry
+                paths.extend(os.path.join(directory, name) for name in entry["files"])
+                pending.extend(os.path.join(directory, name) for name in entry["dirs"])
+            changed = changed or directories.keys() != previous.keys()
+            self.directories = directories
+            self.last_refresh = time.monotonic()
+            if changed or self.trigrams is None:
+                self.paths = sorted(paths)
+                self.trigrams = None
+            if changed:
+                try:
+                    self.save()
+                except OSError as e:
+                    self.output_manager.debug(f"Error saving the path index: {e}")
+
+    def list_directory(self, full_path, mtime):
+        """Return the entry of a directory: its files and its not excluded subdirectories."""
+        files = []
+        dirs = []
+        try:
+            with os.scandir(full_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in self.EXCLUDED_DIRECTORIES:
+                                dirs.append(entry.name)
+                        else:
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return {"mtime": mtime, "files": sorted(files), "dirs": sorted(dirs)}
+
+    @staticmethod
+    def get_trigrams(text):
+        """Return the set of three character sequences of a text."""
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def build_trigrams(self):
+        """Index the position of every path by the trigrams of its lowercase text."""
+        trigrams = {}
+        for position, path in enumerate(self.paths):
+            for trigram in self.get_trigrams(path.lower()):
+                trigrams.setdefault(trigram, []).append(position)
+        self.trigrams = trigrams
+
+    def get_candidates(self, literal):
+        """Return the positions of the paths that contain every trigram of a literal text."""
+        trigrams = self.get_trigrams(literal.lower())
+        if not trigrams:
+            return range(len(self.paths))
+        postings = sorted((self.trigrams.get(trigram, []) for trigram in trigrams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return sorted(candidates)
+
+    @classmethod
+    def translate_glob(cls, pattern):
+        """
+        Return the regular expression of a glob pattern. "*" and "?" do not match "/",
+        "**/" matches any number of directories (none included) and "**" anything.
+        """
+        parts = []
+        for token in cls.GLOB_TOKEN.findall(pattern):
+            if token == "**/":
+                parts.append("(?:.*/)?")
+            elif token == "**":
+                parts.append(".*")
+            elif token == "*":
+                parts.append("[^/]*")
+            elif token == "?":
+                parts.append("[^/]")
+            elif len(token) > 2 and token.startswith("["):
+                members = token[1:-1]
+                negated = members.startswith("!")
+                members = members[1:] if negated else members
+                members = members.replace("\\", "\\\\").replace("^", "\\^")
+                parts.append(f"[{'^' if negated else ''}{members}]")
+            else:
+                parts.append(re.escape(token))
+        return re.compile("".join(parts) + r"\Z", re.IGNORECASE)
+
+    def find(self, pattern, limit=50):
+        """
+        Find files by name or path.
+
+        Args:
+            pattern (str): A glob pattern (e.g. "*.py" or "src/**/test_*.py", where "**/" is
+                any number of directories), matched against the name of the files or, if it
+                has a "/", their path relative to the root; or a text matched as a substring
+                of the path
+                and, if nothing contains it, as a fuzzy subsequence (e.g. "chmgr" finds
+                "chat_manager.py").
+            limit (int): The maximum number of paths returned.
+
+        Returns:
+            tuple: (paths, total): the best matching relative paths and the number of matches.
+        """
+        self.refresh()
+        with self._lock:
+            if self.trigrams is None:
+                self.build_trigrams()
+            paths = self.paths
+            if self.GLOB_CHARACTERS.search(pattern):
+                # Only the paths with the longest literal part of the pattern are matched;
+                # the character classes are not literal text
+                literal = re.sub(r"\[!?\]?[^\]]*\]", "*", pattern).replace("/", "*")
+                literal = max(self.GLOB_CHARACTERS.split(literal), key=len)
+                regex = self.translate_glob(pattern)
+                name_only = "/" not in pattern
+                matches = [
+                    paths[position]
+                    for position in self.get_candidates(literal)
+                    if regex.match(os.path.basename(paths[position]) if name_only
+                                   else paths[position])
+                ]
+                matches.sort(key=lambda path: (path.count("/"), path))
+                return matches[:limit], len(matches)
+
+            query = pattern.lower().strip()
+            matches = [
+                paths[position]
+                for position in self.get_candidates(query)
+                if query in paths[position].lower()
+            ]
+            if not matches:
+                fuzzy = re.compile(".*?".join(map(re.escape, query)), re.IGNORECASE)
+                matches = [path for path in paths if fuzzy.search(path)]
+
+            def rank(path):
+                name = os.path.basename(path).lower()
+                return (
+                    name != query,
+                    not name.startswith(query),
+                    query not in name,
+                    len(path),
+                    path,
+                )
+
+            matches.sort(key=rank)
+            return matches[:limit], len(matches)
@@ -0,0 +1,207 @@
+"""
+This module assembles the system prompt of the GeminiSH application.
+The system instructions file can include other prompt files with {{include: file.md}}
+and place the system information with {{system_information}}. The fully assembled prompt
+is cached on disk with its token count (and the cached content created for it), and the
+cache is only invalidated when one of the source files or the system information changes,
+so the prompt stays byte-identical across runs. Includes are recorded with the directories
+they were searched in, so an include that is created (or shadowed) later also invalidates
+the cache.
+"""
+
+import os
+import re
+import json
+import hashlib
+
+
+class PromptBuilder:
+    """
+    Builds and caches the system prompt.
+
+    Attributes:
+        PROMPTS_DIR (str): The name of the prompts directory.
+        INSTRUCTIONS_FILE (str): The name of the system instructions file.
+        CACHE_FILE_NAME (str): The name of the cache file inside the config directory.
+        cache (dict): The cached prompt, its sources, token count and cached content.
+    """
+
+    PROMPTS_DIR = "prompts"
+    INSTRUCTIONS_FILE = "system_instructions.md"
+    CACHE_FILE_NAME = "prompt_cache.json"
+    INCLUDE_PATTERN = re.compile(r"\{\{\s*include:\s*([^}\s]+)\s*\}\}")
+    SYSTEM_INFORMATION_PLACEHOLDER = "{{system_information}}"
+    MAX_INCLUDE_DEPTH = 10
+
+    def __init__(self, config_manager, output_manager):
+        self.config_manager = config_manager
+        self.output_manager = output_manager
+        self.cache_file = os.path.join(self.config_manager.directory, self.CACHE_FILE_NAME)
+        self.cache = self.load_cache()
+
+    def get_prompt_directories(self):
+        """Return the directories where prompt files are searched, agent directory first."""
+        directories = []
+        if self.config_manager.is_agent:
+            directories.append(
+                os.path.join(self.config_manager.get_agent_directory(), self.PROMPTS_DIR)
+            )
+        directories.append(os.path.join(self.config_manager.get_directory(), self.PROMPTS_DIR))
+        return directories
+
+    def find_prompt_file(self, file_name, directories=None):
+        """Return the path of a prompt file, or None if it does not exist."""
+        for directory in directories or self.get_prompt_directories():
+            file_path = os.path.join(directory, file_name)
+            if os.path.exists(file_path):
+                return file_path
+        return None
+
+    def load_cache(self):
+        """Load the prompt cache file."""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (ValueError, OSError):
+                pass
+        return {}
+
+    def save_cache(self):
+        """Save the prompt cache file."""
+        temp_file = f"{self.cache_file}.tmp"
+        try:
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f, indent=4)
+            os.replace(temp_file, self.cache_file)
+        except OSError as e:
+            self.output_manager.debug(f"Error saving the prompt cache: {e}")
+
+    def build(self):
+        """
+        Return the assembled system prompt, from the cache when the sources did not change.
+
+        Raises:
+            Exception: If the system instructions file does not exist.
+        """
+        system_information = self.config_manager.get_system_information()
+        system_information_hash = self.hash(system_information)
+
+        if self.is_cache_valid(system_information_hash):
+            return self.cache["prompt"]
+
+        instructions_path = self.find_prompt_file(self.INSTRUCTIONS_FILE)
+        if not instructions_path:
+            self.output_manager.debug(
+                f"System instructions not found in {self.get_prompt_directories()}"
+            )
+            raise Exception("System instructions not found.")
+
+        sources = []
+        instructions = self.render_file(instructions_path, sources) or " "
+        if self.SYSTEM_INFORMATION_PLACEHOLDER in instructions:
+            prompt = instructions.replace(self.SYSTEM_INFORMATION_PLACEHOLDER, system_information)
+        else:
+            prompt = instructions + system_information
+
+        self.cache = {
+            "prompt": prompt,
+            "prompt_hash": self.hash(prompt),
+            "sources": sources,
+            "system_information_hash": system_information_hash,
+            "token_count": None,
+            "cached_content": None,
+        }
+        self.save_cache()
+        self.output_manager.debug(f"System prompt assembled from {len(sources)} files")
+        return prompt
+
+    def render_file(self, file_path, sources, depth=0, resolution=None):
+        """
+        Read a prompt file and resolve its includes, recording every source file used.
+
+        Args:
+            file_path (str): The path of the prompt file.
+            sources (list): The list the source files are appended to.
+            depth (int, optional): The include depth of the file.
+            resolution (dict, optional): The include name and search directories of the
+                file, recorded with it.
+        """
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        stat = os.stat(file_path)
+        sources.append(
+            {
+                "path": file_path,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                **(resolution or {}),
+            }
+        )
+
+        def include(match):
+            if depth >= self.MAX_INCLUDE_DEPTH:
+                self.output_manager.warning(f"Too many nested includes in {file_path}")
+                return ""
+            directories = [os.path.dirname(file_path)] + self.get_prompt_directories()
+            include_path = self.find_prompt_file(match.group(1), directories)
+            resolution = {"include": match.group(1), "directories": directories}
+            if not include_path:
+                self.output_manager.warning(f"Prompt include not found: {match.group(1)}")
+                # Recorded so the cache is invalidated when the file is created
+                sources.append({"path": None, "mtime_ns": None, "size": None, **resolution})
+                return ""
+            return self.render_file(include_path, sources, depth + 1, resolution)
+
+        return self.INCLUDE_PATTERN.sub(include, content)
+
+    def is_cache_valid(self, system_information_hash):
+        """Check that the cached prompt was built from the current files and system facts."""
+        if not self.cache.get("prompt") or not self.cache.get("sources"):
+            return False
+        if self.cache.get("system_information_hash") != system_information_hash:
+            return False
+        # The instructions file that would be used now must be the one that was cached
+        if self.find_prompt_file(self.INSTRUCTIONS_FILE) != self.cache["sources"][0]["path"]:
+            return False
+        for source in self.cache["sources"]:
+            # An include must still resolve to the same file, or still be missing
+            if "include" in source:
+                include_path = self.find_prompt_file(source["include"], source["directories"])
+                if include_path != source["path"]:
+                    return False
+                if include_path is None:
+                    continue
+            try:
+                stat = os.stat(source["path"])
+            except OSError:
+                return False
+            if stat.st_mtime_ns != source["mtime_ns"] or stat.st_size != source["size"]:
+                return False
+        return True
+
+    def get_token_count(self):
+        """Return the cached token count of the prompt, or None if it was not counted yet."""
+        return self.cache.get("token_count")
+
+    def set_token_count(self, token_count):
+        """Store the token count of the current prompt."""
+        self.cache["token_count"] = token_count
+        self.save_cache()
+
+    def get_cached_content(self, key):
+        """Return the cached content entry created for the given key, if any."""
+        cached_content = self.cache.get("cached_content")
+        if cached_content and cached_content.get("key") == key:
+            return cached_content
+        return None
+
+    def set_cached_content(self, key, name, expire_time):
+        """Store the cached content created for the current prompt."""
+        self.cache["cached_content"] = {"key": key, "name": name, "expire_time": expire_time}
+        self.save_cache()
+
+    @staticmethod
+    def hash(text):
+        """Return the sha256 hex digest of a text."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
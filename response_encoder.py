@@ -0,0 +1,74 @@
+"""
+This module encodes the function responses sent to the model by the GeminiSH application.
+Structured results, such as the path -> content dict of get_content_of_folder, are packed
+into compact text instead of being converted field by field into a protobuf Struct, which
+is slow for large nested payloads and bloated on the wire. Results larger than
+RESPONSE_UPLOAD_THRESHOLD_CHARS are written to a cache file that is uploaded, and the
+function response only keeps a preview.
+"""
+
+import json
+import hashlib
+
+
+class ResponseEncoder:
+    """
+    Packs function responses into compact text.
+
+    Attributes:
+        upload_threshold (int): Size in characters above which the result is uploaded as a
+            file, 0 to always send it inline.
+        preview_size (int): Characters of an uploaded result kept in the function response.
+    """
+
+    def __init__(self, config_manager, cache_manager):
+        self.config_manager = config_manager
+        self.cache_manager = cache_manager
+
+    @property
+    def upload_threshold(self):
+        return self.config_manager.config["RESPONSE_UPLOAD_THRESHOLD_CHARS"]
+
+    @property
+    def preview_size(self):
+        return self.config_manager.config["RESPONSE_PREVIEW_CHARS"]
+
+    @staticmethod
+    def pack(response):
+        """
+        Return the compact text of a response.
+
+        A dict of texts (e.g. file path -> content) becomes one "==> key <==" section per
+        entry, any other structure becomes JSON without whitespace.
+        """
+        if isinstance(response, str):
+            return response
+        if isinstance(response, dict) and all(
+            isinstance(value, str) for value in response.values()
+        ):
+            return "\n".join(f"==> {key} <==\n{value}" for key, value in response.items())
+        return json.dumps(response, ensure_ascii=False, separators=(",", ":"), default=str)
+
+    def encode(self, function_name, response):
+        """
+        Encode the response of a function.
+
+        Returns:
+            tuple: (text, file_path): the text for the function response, and the path of
+                the file to upload with the full result, or None if it is sent inline.
+        """
+        text = self.pack(response)
+        if not self.upload_threshold or len(text) <= self.upload_threshold:
+            return text, None
+
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        file_path = self.cache_manager.get_file_path(f"{function_name}-{digest}.txt")
+        with open(file_path, "wb") as f:
+            f.write(data)
+        self.cache_manager.add(file_path)
+        preview = (
+            f"[The result of {function_name} has {len(text)} characters and was attached as "
+            f"a text file. It starts with:]\n{text[:self.preview_size]}"
+        )
+        return preview, file_path
@@ -0,0 +1,228 @@
+"""
+This module manages concurrent chat sessions for the GeminiSH application.
+A Session owns its own chat, status and output stream, so one agent process can serve
+many conversations at the same time (a daemon, a batch runner or an HTTP API). The
+active session is tracked with a context variable: the OutputManager, the InputManager
+and the managers that use the chat resolve it at call time, so function modules keep
+using the shared singletons and their output still reaches the right session.
+"""
+
+import io
+import uuid
+import queue
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from rich.console import Console
+
+from chat_manager import ChatManager
+
+_current_session = contextvars.ContextVar("geminiSH_session", default=None)
+_terminal_chat_manager = None
+
+
+def get_current_session():
+    """Return the session active in the current context, or None in the terminal REPL."""
+    return _current_session.get()
+
+
+def set_terminal_chat_manager(chat_manager):
+    """Set the chat manager of the terminal REPL, the one used outside of a session."""
+    global _terminal_chat_manager
+    _terminal_chat_manager = chat_manager
+
+
+def get_current_chat_manager():
+    """
+    Return the chat manager of the active session, or the one of the terminal REPL.
+    Lets function modules keep state per chat; None in a worker process.
+    """
+    session = get_current_session()
+    return session.chat_manager if session else _terminal_chat_manager
+
+
+class SessionStream(io.TextIOBase):
+    """
+    Output stream of a session, used as the file of its rich console.
+    Everything written is published as events to the subscribed queues.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text:
+            self.emit("output", text)
+        return len(text)
+
+    def emit(self, event, data):
+        """Publish an event (output, status, done...) to every subscriber."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.put((event, data))
+
+    def subscribe(self, subscriber=None):
+        """Return a queue (a new one if not given) that receives the events of the stream."""
+        subscriber = queue.Queue() if subscriber is None else subscriber
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Stop sending events to a queue returned by subscribe."""
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+
+class Session:
+    """
+    A conversation with the agent, independent from the terminal REPL.
+
+    Attributes:
+        session_id (str): The id of the session, which is also its chat id.
+        chat_manager (ChatManager): The chat of the session.
+        stream (SessionStream): The output stream of the session.
+        console (Console): The console the OutputManager prints to inside the session.
+        status_stack (list): The status messages currently displayed, innermost last.
+        lock (threading.Lock): Serializes the messages of the session.
+        input_callback (callable): Answers the questions asked to the user, called with
+            (text, choices, default). Without it the session is non-interactive: inputs
+            return an empty string and choices return None.
+    """
+
+    CONSOLE_WIDTH = 100
+
+    def __init__(self, agent, chat_manager, input_callback=None):
+        self.agent = agent
+        self.chat_manager = chat_manager
+        self.session_id = chat_manager.chat_id
+        self.created_at = datetime.now().isoformat()
+        self.stream = SessionStream()
+        self.console = Console(
+            file=self.stream, width=self.CONSOLE_WIDTH, force_terminal=False, soft_wrap=True
+        )
+        self.status_stack = []
+        self.lock = threading.Lock()
+        self.input_callback = input_callback
+
+    @property
+    def status(self):
+        """The current status message of the session, or None when it is idle."""
+        return self.status_stack[-1] if self.status_stack else None
+
+    @contextmanager
+    def activate(self):
+        """Make this the active session of the current context."""
+        token = _current_session.set(self)
+        try:
+            yield self
+        finally:
+            _current_session.reset(token)
+
+    def ask(self, text, choices=None, default=None):
+        """Answer a question asked to the user inside the session."""
+        if self.input_callback:
+            return self.input_callback(text, choices, default)
+        return None if choices else ""
+
+    def process_message(self, message, events=None):
+        """
+        Process a message in the session, waiting for any message already in progress.
+
+        Args:
+            message (str): The user message.
+            events (queue.Queue, optional): Receives the (event, data) tuples of this message
+                only, ending with ("done", session_id), to stream them while it runs.
+
+        Returns:
+            str: Everything printed by the agent while processing the message.
+        """
+        with self.lock:
+            subscriber = self.stream.subscribe()
+            if events is not None:
+                self.stream.subscribe(events)
+            try:
+                with self.activate():
+                    self.agent.process_message(message)
+            except Exception as e:
+                self.stream.emit("error", str(e))
+                raise
+            finally:
+                self.stream.emit("done", self.session_id)
+                self.stream.unsubscribe(subscriber)
+                if events is not None:
+                    self.stream.unsubscribe(events)
+        output = []
+        while not subscriber.empty():
+            event, data = subscriber.get_nowait()
+            if event == "output":
+                output.append(data)
+        return "".join(output)
+
+
+class SessionManager:
+    """
+    Creates and tracks the sessions served by one agent.
+
+    Attributes:
+        agent (GeminiAgent): The agent whose managers the sessions share.
+        sessions (dict): Session id -> Session.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def create_session(self, chat_id=None, input_callback=None):
+        """
+        Create a session, continuing the chat with the given id if it is in the history.
+
+        Returns:
+            Session: The new session.
+        """
+        agent = self.agent
+        chat_manager = ChatManager(
+            agent.config_manager,
+            agent.output_manager,
+            agent.input_manager,
+            agent.state_manager,
+            chat_history=agent.chat_manager.chat_history,
+            history_writer=agent.chat_manager.history_writer,
+        )
+        if chat_id:
+            with self._lock:
+                if chat_id in self.sessions:
+                    return self.sessions[chat_id]
+            if chat_id in chat_manager.chat_history:
+                chat_manager.load_chat(chat_id)
+            else:
+                chat_manager.chat_id = chat_id
+        else:
+            chat_manager.chat_id = str(uuid.uuid4())
+        session = Session(agent, chat_manager, input_callback)
+        with self._lock:
+            return self.sessions.setdefault(session.session_id, session)
+
+    def get_session(self, session_id):
+        """Return a session by id, or None if it does not exist."""
+        with self._lock:
+            return self.sessions.get(session_id)
+
+    def close_session(self, session_id):
+        """Forget a session; its chat stays in the history."""
+        with self._lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def list_sessions(self):
+        """Return the open sessions."""
+        with self._lock:
+            return list(self.sessions.values())
@@ -19,13 +19,18 @@ setup(
         "prompt_toolkit",
         "rich",
         "screeninfo",
-        "pyautogui",
+        "pillow",
         "pyperclip",
         "sounddevice",
         "soundfile",
-        "pydub",
         "unidiff",
     ],
+    extras_require={
+        # Faster, smaller compression of the large results stored with the chat history
+        "zstd": ["zstandard"],
+        # Local text extraction of PDF files, instead of uploading them
+        "pdf": ["pypdf"],
+    },
     entry_points={
         "console_scripts": [
             "geminiSH=geminiSH.main:main",
@@ -2,7 +2,7 @@
 This module manages the state of the GeminiSH application.
 """
 
-import os
+from prompt_builder import PromptBuilder
 
 
 class StateManager:
@@ -12,6 +12,7 @@ class StateManager:
     Attributes:
         config_manager: An instance of ConfigManager to handle configuration.
         output_manager: An instance of OutputManager to handle output operations.
+        prompt_builder: An instance of PromptBuilder that assembles the system prompt.
         state: A dictionary to store the state of the application.
     """
 
@@ -19,32 +20,14 @@ class StateManager:
         self.config_manager = config_manager
         self.output_manager = output_manager
         self.state = {"is_first_run": False, "system_instructions": ""}
+        self.prompt_builder = PromptBuilder(config_manager, output_manager)
 
         self.init_state()
 
     def init_state(self):
         """Initialize the application state."""
-        # Load the system instructions from the config
-        if self.config_manager.is_agent:
-            agent_instructions_path = os.path.join(
-                self.config_manager.get_agent_directory(), "prompts", "system_instructions.md"
-            )
-            if os.path.exists(agent_instructions_path):
-                with open(agent_instructions_path, "r", encoding="utf-8") as f:
-                    self.state["system_instructions"] = f.read() or " "
-                return
-
-        default_instructions_path = os.path.join(
-            self.config_manager.get_directory(), "prompts", "system_instructions.md"
-        )
-        if os.path.exists(default_instructions_path):
-            with open(default_instructions_path, "r", encoding="utf-8") as f:
-                self.state["system_instructions"] = f.read() or " "
-        else:
-            self.output_manager.debug(
-                f"System instructions not found in {default_instructions_path}"
-            )
-            raise Exception("System instructions not found.")
+        # The prompt builder only reads the prompt files when they changed since the last run
+        self.state["system_instructions"] = self.prompt_builder.build()
 
     def is_first_run(self):
         """Check if it is the first time the application is run."""
@@ -0,0 +1,266 @@
+"""
+This module records performance telemetry for the GeminiSH application.
+Model calls, function executions, uploads, history saves and rendering are wrapped in
+spans that capture their latency and attributes such as bytes sent and received, token
+counts and cache hits. The spans can be summarized in the REPL with the /stats command
+and exported as Chrome trace or OpenTelemetry (OTLP/JSON) files for offline analysis.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+class TelemetryManager:
+    """
+    Collects timing spans for the application.
+    This class is designed as a singleton so managers and function modules share the spans.
+
+    Attributes:
+        spans (deque): The finished spans, oldest first.
+        turn (int): The number of the current turn.
+        enabled (bool): Whether spans are recorded.
+    """
+
+    SERVICE_NAME = "geminiSH"
+    MAX_SPANS = 10000
+    EXPORT_FORMATS = ["chrome", "otel"]
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, config_manager=None):
+        if not hasattr(self, "initialized"):
+            self.config_manager = config_manager
+            config = config_manager.config if config_manager else {}
+            self.enabled = config.get("TELEMETRY_ENABLED", True)
+            self.spans = deque(maxlen=config.get("TELEMETRY_MAX_SPANS", self.MAX_SPANS))
+            self.turn = 0
+            self.trace_id = uuid.uuid4().hex
+            self._local = threading.local()
+            self._lock = threading.Lock()
+            self.initialized = True
+
+    def start_turn(self):
+        """Start a new turn; spans of the turn share the same trace id."""
+        with self._lock:
+            self.turn += 1
+            self.trace_id = uuid.uuid4().hex
+
+    @contextmanager
+    def span(self, name, category, **attributes):
+        """
+        Context manager that records a span around a block of code.
+
+        Args:
+            name (str): The name of the span, e.g. the function name.
+            category (str): model, function, upload, history, render or turn.
+            **attributes: Initial attributes of the span (bytes_in, bytes_out, tokens...).
+
+        Yields:
+            dict: The attributes of the span, which the block can update.
+        """
+        if not self.enabled:
+            yield attributes
+            return
+
+        stack = self._get_stack()
+        span = {
+            "name": name,
+            "category": category,
+            "turn": self.turn,
+            "trace_id": self.trace_id,
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": stack[-1]["span_id"] if stack else None,
+            "thread_id": threading.get_ident(),
+            "start": time.time_ns(),
+            "duration": 0,
+            "attributes": attributes,
+        }
+        stack.append(span)
+        start = time.perf_counter_ns()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = type(e).__name__
+            raise
+        finally:
+            span["duration"] = time.perf_counter_ns() - start
+            stack.pop()
+            with self._lock:
+                self.spans.append(span)
+
+    def record(self, name, category, **attributes):
+        """Record an instantaneous span, e.g. a cache hit that skipped an operation."""
+        with self.span(name, category, **attributes):
+            pass
+
+    def _get_stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def reset(self):
+        """Remove all the recorded spans."""
+        with self._lock:
+            self.spans.clear()
+
+    def get_stats(self, turn=None):
+        """
+        Aggregate the spans by category.
+
+        Args:
+            turn (int, optional): Only aggregate the spans of this turn.
+
+        Returns:
+            dict: category -> {"count", "total_ms", "max_ms", "bytes_in", "bytes_out",
+                  "tokens", "cache_hits"}.
+        """
+        stats = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            if turn is not None and span["turn"] != turn:
+                continue
+            attributes = span["attributes"]
+            category = stats.setdefault(
+                span["category"],
+                {
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "bytes_in": 0,
+                    "bytes_out": 0,
+                    "tokens": 0,
+                    "cache_hits": 0,
+                },
+            )
+            duration_ms = span["duration"] / 1e6
+            category["count"] += 1
+            category["total_ms"] += duration_ms
+            category["max_ms"] = max(category["max_ms"], duration_ms)
+            category["bytes_in"] += attributes.get("bytes_in", 0)
+            category["bytes_out"] += attributes.get("bytes_out", 0)
+            category["tokens"] += attributes.get("prompt_tokens", 0) + attributes.get(
+                "output_tokens", 0
+            )
+            category["cache_hits"] += 1 if attributes.get("cache_hit") else 0
+        return stats
+
+    def get_stats_markdown(self):
+        """Return the stats of the session and of the last turn as Markdown tables."""
+        sections = [("Last turn", self.get_stats(self.turn)), ("Session", self.get_stats())]
+        text = []
+        for title, stats in sections:
+            text.append(f"## {title}\n")
+            if not stats:
+                text.append("No data recorded.\n")
+                continue
+            text.append(
+                "| Category | Count | Total ms | Avg ms | Max ms | Bytes out | Bytes in "
+                "| Tokens | Cache hits |"
+            )
+            text.append("|---|---:|---:|---:|---:|---:|---:|---:|---:|")
+            for category, values in sorted(stats.items()):
+                text.append(
+                    f"| {category} | {values['count']} | {values['total_ms']:.1f} "
+                    f"| {values['total_ms'] / values['count']:.1f} | {values['max_ms']:.1f} "
+                    f"| {values['bytes_out']} | {values['bytes_in']} | {values['tokens']} "
+                    f"| {values['cache_hits']} |"
+                )
+            text.append("")
+        return "\n".join(text)
+
+    def export(self, file_path, export_format="chrome"):
+        """
+        Export the recorded spans to a file.
+
+        Args:
+            file_path (str): The destination file.
+            export_format (str): "chrome" (Chrome trace event format, for chrome://tracing
+                or Perfetto) or "otel" (OpenTelemetry OTLP/JSON).
+
+        Returns:
+            int: The number of exported spans.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        if export_format == "chrome":
+            data = self._to_chrome_trace(spans)
+        elif export_format == "otel":
+            data = self._to_otel(spans)
+        else:
+            raise ValueError(f"Unknown export format: {export_format}")
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, default=str)
+        return len(spans)
+
+    def _to_chrome_trace(self, spans):
+        pid = os.getpid()
+        return {
+            "displayTimeUnit": "ms",
+            "traceEvents": [
+                {
+                    "name": span["name"],
+                    "cat": span["category"],
+                    "ph": "X",
+                    "ts": span["start"] / 1000,
+                    "dur": span["duration"] / 1000,
+                    "pid": pid,
+                    "tid": span["thread_id"],
+                    "args": dict(span["attributes"], turn=span["turn"]),
+                }
+                for span in spans
+            ],
+        }
+
+    def _to_otel(self, spans):
+        otel_spans = []
+        for span in spans:
+            attributes = dict(span["attributes"], category=span["category"], turn=span["turn"])
+            otel_span = {
+                "traceId": span["trace_id"],
+                "spanId": span["span_id"],
+                "name": span["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(span["start"]),
+                "endTimeUnixNano": str(span["start"] + span["duration"]),
+                "attributes": [
+                    {"key": key, "value": self._to_otel_value(value)}
+                    for key, value in attributes.items()
+                ],
+            }
+            if span["parent_id"]:
+                otel_span["parentSpanId"] = span["parent_id"]
+            if "error" in span["attributes"]:
+                otel_span["status"] = {"code": 2, "message": span["attributes"]["error"]}
+            otel_spans.append(otel_span)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": self.SERVICE_NAME}}
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": self.SERVICE_NAME}, "spans": otel_spans}],
+                }
+            ]
+        }
+
+    def _to_otel_value(self, value):
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
@@ -0,0 +1,135 @@
+"""
+This module selects the functions declared to the model on every request of the GeminiSH
+application. Instead of sending every loaded function as a tool, the ToolRouter sends a
+core set plus the functions whose name and description best match the user message
+(keyword match weighted by IDF) and the functions already used in the chat. The Tool
+objects are cached by function subset, so a large function library does not inflate the
+size, latency and cost of every request.
+"""
+
+import re
+import math
+from collections import OrderedDict
+from lazy_module import LazyModule
+
+glm = LazyModule("google.ai.generativelanguage")
+
+
+class ToolRouter:
+    """
+    Picks the relevant subset of functions for a request.
+
+    Attributes:
+        function_manager (FunctionManager): Provides the functions and their declarations.
+        tools_cache (OrderedDict): Tuple of function names -> Tool, least recently used first.
+    """
+
+    WORD_PATTERN = re.compile(r"[a-z0-9]+")
+    CACHE_SIZE = 32
+    # Recent turns whose function calls keep their functions in the subset
+    RECENT_TURNS = 10
+
+    def __init__(self, config_manager, function_manager):
+        self.config_manager = config_manager
+        self.function_manager = function_manager
+        self.tools_cache = OrderedDict()
+        self.index = None
+
+    def is_active(self):
+        """Check if routing applies, i.e. it is enabled and there are enough functions."""
+        config = self.config_manager.config
+        return (
+            config["TOOL_ROUTER_ENABLED"]
+            and len(self.function_manager.functions) > config["TOOL_ROUTER_MIN_FUNCTIONS"]
+        )
+
+    def clear(self):
+        """Forget the cached Tools and index, e.g. after the functions were reloaded."""
+        self.tools_cache.clear()
+        self.index = None
+
+    @classmethod
+    def tokenize(cls, text):
+        """Split a text (or a snake_case name) into lowercase words, without plural s."""
+        words = cls.WORD_PATTERN.findall(text.lower().replace("_", " "))
+        return [word[:-1] if len(word) > 3 and word.endswith("s") else word for word in words]
+
+    def build_index(self):
+        """Index the words of the name and description of every function."""
+        documents = {}
+        for func_name, func in self.function_manager.functions.items():
+            name_words = set(self.tokenize(func_name))
+            documents[func_name] = (name_words, set(self.tokenize(func.__doc__ or "")) | name_words)
+        document_count = len(documents) or 1
+        frequencies = {}
+        for _, words in documents.values():
+            for word in words:
+                frequencies[word] = frequencies.get(word, 0) + 1
+        idf = {
+            word: math.log(1 + document_count / frequency)
+            for word, frequency in frequencies.items()
+        }
+        self.index = (documents, idf)
+
+    def score(self, query):
+        """Return function name -> relevance of the function for the query text."""
+        if self.index is None:
+            self.build_index()
+        documents, idf = self.index
+        query_words = set(self.tokenize(query))
+        scores = {}
+        for func_name, (name_words, words) in documents.items():
+            score = sum(idf[word] for word in query_words & words)
+            # A word of the function name is a stronger signal than one of its description
+            score += sum(idf[word] for word in query_words & name_words)
+            if score:
+                scores[func_name] = score
+        return scores
+
+    def select(self, chat):
+        """
+        Return the names of the functions to declare for the next request of a chat.
+
+        Args:
+            chat (list): The Contents of the chat; the last user text is the query.
+        """
+        config = self.config_manager.config
+        functions = self.function_manager.functions
+        selected = [name for name in config["TOOL_ROUTER_CORE_FUNCTIONS"] if name in functions]
+
+        query = ""
+        for content in reversed(chat):
+            texts = [part.text for part in content.parts if "text" in part]
+            if content.role == "user" and texts:
+                query = " ".join(texts)
+                break
+        for content in chat[-self.RECENT_TURNS:]:
+            for part in content.parts:
+                if "function_call" in part and part.function_call.name in functions:
+                    selected.append(part.function_call.name)
+
+        scores = self.score(query)
+        ranked = sorted(scores, key=lambda name: (-scores[name], name))
+        selected.extend(ranked[: config["TOOL_ROUTER_MAX_FUNCTIONS"]])
+        return sorted(set(selected))
+
+    def get_tools(self, chat):
+        """
+        Return the Tool with the selected functions of a chat, from the cache if possible,
+        or None if no function was selected (the model then uses all its tools).
+        """
+        key = tuple(self.select(chat))
+        if not key:
+            return None
+        tools = self.tools_cache.get(key)
+        if tools is None:
+            declarations = dict(
+                zip(self.function_manager.functions, self.function_manager.get_as_declarations())
+            )
+            tools = glm.Tool(function_declarations=[declarations[name] for name in key])
+            self.tools_cache[key] = tools
+            if len(self.tools_cache) > self.CACHE_SIZE:
+                self.tools_cache.popitem(last=False)
+        else:
+            self.tools_cache.move_to_end(key)
+        return tools